@@ -0,0 +1,40 @@
+#encode/decode ns per message and bytes on the wire: json lines vs binary frames
+#usage: python bench_codec.py [messages]
+import json, random, sys, time
+import codec
+
+def bench(name, encode, decode, msgs):
+    t0 = time.perf_counter()
+    wire = b"".join(encode(m) for m in msgs)
+    t1 = time.perf_counter()
+    out = decode(wire)
+    t2 = time.perf_counter()
+    assert len(out) == len(msgs), (name, len(out))
+    n = len(msgs)
+    print(f"{name:>14}: encode {(t1 - t0) / n * 1e9:7.0f} ns  decode {(t2 - t1) / n * 1e9:7.0f} ns"
+          f"  {len(wire) / n:6.1f} B/msg")
+
+def json_encode(m):
+    return (json.dumps(m) + "\n").encode()
+
+def json_decode(wire):
+    return [json.loads(line) for line in wire.split(b"\n") if line]
+
+def bin_encode(m):
+    return codec.encode_reading(m["sensor_id"], m["density"], m["ts"], m["seq"])
+
+def bin_decode(wire):
+    return codec.decode_frames(wire)[0]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    now = time.time()
+    msgs = [{"sensor_id": f"S-{i % 500:03d}", "density": max(0.0, random.gauss(35, 10)),
+             "ts": now + i * 1e-4, "seq": i} for i in range(n)]
+    print(f"messages={n}  generic body={'msgpack' if codec.msgpack else 'json (msgpack not installed)'}")
+    bench("json lines", json_encode, json_decode, msgs)
+    bench("binary", bin_encode, bin_decode, msgs)
+    bench("binary generic", codec.encode_generic, bin_decode, msgs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#tracemalloc benchmark: bytes per sample held by the rolling window
+#compares the old deque of (ts, density) tuples against RingBuffer
+#usage: python bench_memory.py [samples]
+import random, sys, time, tracemalloc
+from collections import deque
+from ring_buffer import RingBuffer
+
+def measure(fill, n):
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    store = fill(n)
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, cur - base, peak - base
+
+def fill_deque(n):
+    d = deque()
+    now = time.time()
+    for i in range(n):
+        d.append((now + i * 1e-6, random.random() * 70))
+    return d
+
+def fill_ring(n):
+    r = RingBuffer()
+    now = time.time()
+    for i in range(n):
+        r.append(now + i * 1e-6, random.random() * 70)
+    return r
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"samples={n}")
+    for name, fill in (("deque[tuple]", fill_deque), ("RingBuffer", fill_ring)):
+        store, cur, peak = measure(fill, n)
+        extra = ""
+        if isinstance(store, RingBuffer):
+            extra = f" capacity={store.capacity} ({store.nbytes() / store.capacity:.0f} B/slot)"
+        print(f"{name:>14}: {cur / n:7.1f} B/sample  peak {peak / n:7.1f} B/sample{extra}")
+        del store
+
+    # bulk stats straight off the zero-copy views
+    r = fill_ring(n)
+    t0 = time.perf_counter()
+    total = sum(sum(seg) for seg in r.value_views())
+    print(f"bulk mean over views: {total / len(r):.3f} in {(time.perf_counter() - t0) * 1e3:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#micro-benchmark: per-sample cost of add()+avg() as the 30s window grows
+#the old sum-over-deque version grows linearly, RollingWindow should stay flat
+#usage: python bench_rolling.py
+import time
+from collections import deque
+from rolling_window import RollingWindow
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+OPS = 2_000
+
+class NaiveWindow:
+    # the previous implementation, kept here only for comparison
+    def __init__(self, window_sec):
+        self.window = window_sec
+        self.samples = deque()
+    def add(self, value, now):
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        self.samples.append((now, float(value)))
+    def avg(self):
+        if not self.samples:
+            return 0.0
+        return sum(d for _, d in self.samples) / len(self.samples)
+
+def per_sample_ns(win, size):
+    # fill the window with `size` samples spread over 30s, then time steady-state ops
+    step = 30.0 / size
+    now = 0.0
+    for _ in range(size):
+        now += step
+        win.add(35.0, now)
+    t0 = time.perf_counter()
+    for i in range(OPS):
+        now += step
+        win.add(35.0 + (i % 7), now)
+        win.avg()
+    return (time.perf_counter() - t0) / OPS * 1e9
+
+def main():
+    print(f"{'window':>10} {'naive ns/op':>14} {'rolling ns/op':>14} {'rolling+stats':>14}")
+    for size in SIZES:
+        naive = per_sample_ns(NaiveWindow(30), size) if size <= 100_000 else float("nan")
+        rolling = per_sample_ns(RollingWindow(30), size)
+        full = per_sample_ns(RollingWindow(30, track_minmax=True, track_var=True), size)
+        print(f"{size:>10} {naive:>14.0f} {rolling:>14.0f} {full:>14.0f}")
+
+if __name__ == "__main__":
+    main()
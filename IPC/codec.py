@@ -0,0 +1,89 @@
+#compact binary wire format, an alternative to one json object per line
+#
+#every frame is a 4 byte big-endian length followed by the body, the first body byte is the type:
+#    READING  B type | I seq | d ts | d density | B len | sensor_id (utf-8)
+#    ACK      B type | B ok  | I seq | I count  | d rolling_avg_30s
+#    GENERIC  B type | any object, msgpack if installed otherwise utf-8 json
+#
+#TCP connections start in json. a client that wants binary sends HELLO_LINE as its first
+#line; the server answers with one json line and both sides switch to frames.
+#UDP datagrams are self describing: a json datagram starts with "{", a binary one starts
+#with the high byte of its length prefix, which is always 0 for frames under 16 MB.
+import json, struct
+
+try:
+    import msgpack
+except ImportError:  # optional, the generic body falls back to json
+    msgpack = None
+
+CODEC_JSON = "json"
+CODEC_BIN = "bin1"
+HELLO = {"codec": CODEC_BIN}
+HELLO_LINE = (json.dumps(HELLO) + "\n").encode()
+
+READING, ACK, GENERIC = 1, 2, 3
+
+#largest body we accept, far above any real frame. a bigger length field is garbage or
+#hostile, and trusting it would make a reader buffer forever
+MAX_FRAME = 1 << 20
+
+_LEN = struct.Struct("!I")
+_READING = struct.Struct("!BIddB")
+_ACK = struct.Struct("!BBIId")
+
+def encode_reading(sensor_id, density, ts=0.0, seq=0):
+    sid = sensor_id.encode() if isinstance(sensor_id, str) else sensor_id
+    body = _READING.pack(READING, seq, ts, density, len(sid)) + sid
+    return _LEN.pack(len(body)) + body
+
+def encode_ack(rolling_avg, seq=0, count=0, ok=True):
+    return _LEN.pack(_ACK.size) + _ACK.pack(ACK, 1 if ok else 0, seq, count, rolling_avg)
+
+def encode_generic(obj):
+    if msgpack is not None:
+        payload = msgpack.packb(obj, use_bin_type=True)
+    else:
+        payload = json.dumps(obj, separators=(",", ":")).encode()
+    return _LEN.pack(len(payload) + 1) + bytes((GENERIC,)) + payload
+
+#decode every complete frame in buf, returns (frames, unconsumed tail)
+#readings come back as (READING, seq, ts, density, sensor_id)
+#acks as (ACK, ok, seq, count, rolling_avg), generic bodies as (GENERIC, obj)
+#a malformed frame (bad length, unknown type, body shorter than its type) raises ValueError
+def decode_frames(buf):
+    frames = []
+    off, end = 0, len(buf)
+    while end - off >= 4:
+        (n,) = _LEN.unpack_from(buf, off)
+        if n < 1 or n > MAX_FRAME:
+            raise ValueError(f"bad frame length {n}")
+        if end - off - 4 < n:
+            break
+        start = off + 4
+        kind = buf[start]
+        if kind == READING:
+            if n < _READING.size:
+                raise ValueError(f"short READING frame ({n} bytes)")
+            _, seq, ts, density, slen = _READING.unpack_from(buf, start)
+            s = start + _READING.size
+            if n < _READING.size + slen:
+                raise ValueError(f"READING frame too short for its sensor id ({n} bytes)")
+            frames.append((READING, seq, ts, density, bytes(buf[s:s + slen]).decode()))
+        elif kind == ACK:
+            if n < _ACK.size:
+                raise ValueError(f"short ACK frame ({n} bytes)")
+            _, ok, seq, count, avg = _ACK.unpack_from(buf, start)
+            frames.append((ACK, bool(ok), seq, count, avg))
+        elif kind == GENERIC:
+            payload = bytes(buf[start + 1:start + n])
+            if msgpack is not None:
+                frames.append((GENERIC, msgpack.unpackb(payload, raw=False)))
+            else:
+                frames.append((GENERIC, json.loads(payload)))
+        else:
+            raise ValueError(f"unknown frame type {kind}")
+        off = start + n
+    return frames, buf[off:]
+
+def is_binary_datagram(data):
+    return len(data) >= 4 and data[0] == 0
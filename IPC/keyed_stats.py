@@ -0,0 +1,212 @@
+#per-sensor and per-region windowed averages for dashboards
+#
+#every key keeps a small ring of time buckets per window (5 s and 30 s in 1 s buckets,
+#5 min in 10 s buckets) with a running sum/count, so memory is keys x buckets no matter
+#how many readings arrive, and a window average is O(1). averages cover the last
+#`window` seconds rounded to whole buckets.
+#each window also keeps its keys ranked by average in a sorted list, so top-k is a slice
+#of the first k entries instead of a scan. the ranking is updated on every reading and
+#swept for expired buckets at most once per second.
+import time
+from bisect import bisect_left, insort
+
+WINDOWS = {5: 1.0, 30: 1.0, 300: 10.0}  # window seconds -> bucket seconds
+SWEEP_SEC = 1.0
+
+
+class _Ring:
+    __slots__ = ("sums", "counts", "last", "total", "n", "bucket")
+
+    def __init__(self, nbuckets, bucket):
+        self.sums = [0.0] * nbuckets
+        self.counts = [0] * nbuckets
+        self.last = None    # absolute bucket number of the newest bucket
+        self.total = 0.0
+        self.n = 0
+        self.bucket = bucket
+
+    #clear buckets that fell out of the window up to absolute bucket b
+    def advance(self, b):
+        last = self.last
+        if last is None or b <= last:
+            if last is None:
+                self.last = b
+            return
+        size = len(self.sums)
+        for i in range(last + 1, min(b, last + size) + 1):
+            j = i % size
+            self.total -= self.sums[j]
+            self.n -= self.counts[j]
+            self.sums[j] = 0.0
+            self.counts[j] = 0
+        self.last = b
+        if self.n == 0:
+            self.total = 0.0
+
+    def add(self, value, b):
+        self.advance(b)
+        j = b % len(self.sums)
+        self.sums[j] += value
+        self.counts[j] += 1
+        self.total += value
+        self.n += 1
+
+    def avg(self):
+        return self.total / self.n if self.n else 0.0
+
+
+class KeyedWindowStats:
+    def __init__(self, windows=WINDOWS):
+        self.windows = dict(windows)
+        self.series = {}   # key -> {window: _Ring}
+        self.rank = {w: [] for w in self.windows}   # window -> sorted [(-avg, key)]
+        self.ranked = {w: {} for w in self.windows}  # window -> {key: (-avg, key)}
+        self.last_sweep = 0.0
+
+    def __len__(self):
+        return len(self.series)
+
+    def add(self, key, value, now=None):
+        if now is None:
+            now = time.time()
+        rings = self.series.get(key)
+        if rings is None:
+            rings = {w: _Ring(int(round(w / b)), b) for w, b in self.windows.items()}
+            self.series[key] = rings
+        for w, ring in rings.items():
+            ring.add(value, int(now // ring.bucket))
+            self._rerank(w, key, ring)
+        if now - self.last_sweep >= SWEEP_SEC:
+            self.sweep(now)
+
+    def get(self, key, now=None):
+        sums = self.sums(key, now)
+        if sums is None:
+            return None
+        return {w: (total / n if n else 0.0, n) for w, (total, n) in sums.items()}
+
+    #{window: (sum, count)} for one key; unlike averages these add up across shards
+    def sums(self, key, now=None):
+        rings = self.series.get(key)
+        if rings is None:
+            return None
+        if now is None:
+            now = time.time()
+        out = {}
+        for w, ring in rings.items():
+            #advancing can expire buckets; re-rank here, sweep() only sees its own changes
+            before = (ring.n, ring.total)
+            ring.advance(int(now // ring.bucket))
+            if (ring.n, ring.total) != before:
+                self._rerank(w, key, ring)
+            out[w] = (ring.total, ring.n)
+        return out
+
+    def top(self, k, window, now=None):
+        if window not in self.rank:
+            raise ValueError(f"unknown window {window}, have {sorted(self.windows)}")
+        if now is None:
+            now = time.time()
+        if now - self.last_sweep >= SWEEP_SEC:
+            self.sweep(now)
+        return [(key, -neg) for neg, key in self.rank[window][:k]]
+
+    #top() with (key, sum, count), for merging with other shards
+    def top_sums(self, k, window, now=None):
+        return [(key, self.series[key][window].total, self.series[key][window].n)
+                for key, _ in self.top(k, window, now)]
+
+    #expire old buckets for every key and re-rank the ones that changed; keys with no
+    #readings left in the largest window are dropped so memory follows live sensors
+    def sweep(self, now):
+        self.last_sweep = now
+        longest = max(self.windows)
+        for key in list(self.series):
+            rings = self.series[key]
+            for w, ring in rings.items():
+                before = (ring.n, ring.total)
+                ring.advance(int(now // ring.bucket))
+                if (ring.n, ring.total) != before:
+                    self._rerank(w, key, ring)
+            if rings[longest].n == 0:
+                for w in rings:
+                    self._unrank(w, key)
+                del self.series[key]
+
+    def _unrank(self, w, key):
+        entry = self.ranked[w].pop(key, None)
+        if entry is not None:
+            lst = self.rank[w]
+            i = bisect_left(lst, entry)
+            if i < len(lst) and lst[i] == entry:
+                del lst[i]
+
+    def _rerank(self, w, key, ring):
+        self._unrank(w, key)
+        if ring.n:
+            entry = (-ring.avg(), key)
+            insort(self.rank[w], entry)
+            self.ranked[w][key] = entry
+
+
+#the sensor and region engines behind the {"query": ...} command
+class DensityStats:
+    def __init__(self, windows=WINDOWS):
+        self.sensors = KeyedWindowStats(windows)
+        self.regions = KeyedWindowStats(windows)
+
+    def record(self, sensor_id, density, now=None, region=None):
+        if sensor_id is not None:
+            self.sensors.add(str(sensor_id), density, now)
+        if region is not None:
+            self.regions.add(str(region), density, now)
+
+    #{"query": "sensor", "sensor_id": "S-001"}
+    #{"query": "region", "region": "north"}
+    #{"query": "top", "k": 5, "window": 30, "by": "sensor" | "region"}
+    def query(self, msg, now=None):
+        return self.merge(msg, [self.partial(msg, now, every_key=False)])
+
+    #this instance's share of a query as sums and counts, for merge(). a sensor or region
+    #gives {window: (sum, count)} or None; top gives [(key, sum, count)]. with every_key
+    #top sends every ranked key: a key may also have readings on another shard, and only
+    #the combined average decides whether it makes the top k
+    def partial(self, msg, now=None, every_key=True):
+        q = msg.get("query")
+        if q in ("sensor", "region"):
+            engine = self.sensors if q == "sensor" else self.regions
+            return engine.sums(str(msg.get("sensor_id" if q == "sensor" else "region")), now)
+        if q == "top":
+            engine = self.regions if msg.get("by") == "region" else self.sensors
+            k = len(engine) if every_key else int(msg.get("k", 10))
+            return engine.top_sums(k, int(msg.get("window", 30)), now)
+        return None
+
+    #the reply to a query from the partials of one or more instances (sharded server)
+    @staticmethod
+    def merge(msg, partials):
+        q = msg.get("query")
+        if q in ("sensor", "region"):
+            key = msg.get("sensor_id" if q == "sensor" else "region")
+            sums = {}
+            for found in partials:
+                for w, (total, n) in (found or {}).items():
+                    t0, n0 = sums.get(w, (0.0, 0))
+                    sums[w] = (t0 + total, n0 + n)
+            if not sums:
+                return {"ok": False, "error": f"unknown {q} {key}"}
+            return {"ok": True, q if q == "region" else "sensor_id": key,
+                    "avg": {str(w): t / n if n else 0.0 for w, (t, n) in sums.items()},
+                    "count": {str(w): n for w, (_, n) in sums.items()}}
+        if q == "top":
+            window = int(msg.get("window", 30))
+            k = int(msg.get("k", 10))
+            sums = {}
+            for entries in partials:
+                for key, total, n in entries:
+                    t0, n0 = sums.get(key, (0.0, 0))
+                    sums[key] = (t0 + total, n0 + n)
+            ranked = sorted((-(t / n), key) for key, (t, n) in sums.items() if n)
+            return {"ok": True, "window": window, "by": msg.get("by", "sensor"),
+                    "top": [[key, -neg] for neg, key in ranked[:k]]}
+        return {"ok": False, "error": f"unknown query {q!r}"}
@@ -0,0 +1,157 @@
+#load generator for server.py: opens many sensor connections (same schema as sensor.py)
+#and reports connections sustained, p50/p99 ack latency and the server's RSS
+#usage: python loadgen.py --sensors 5000 --duration 20 --mode both
+#       python loadgen.py --mode none --server-pid <pid>   (use an already running server)
+import argparse, asyncio, json, os, random, subprocess, sys, time
+
+HOST, PORT = "127.0.0.1", 9009
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def raise_fd_limit():
+    # every sensor is one fd on both sides
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def rss_mb(pid):
+    # linux only; returns None where /proc is missing
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, int(round(p / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+async def sensor(sid, stop_at, interval, lat, stats):
+    try:
+        reader, writer = await asyncio.open_connection(HOST, PORT)
+    except OSError:
+        stats["connect_failed"] += 1
+        return
+    stats["connected"] += 1
+    alive = True
+    try:
+        # spread the first send so all sensors don't fire in lockstep
+        await asyncio.sleep(random.uniform(0, interval))
+        while time.time() < stop_at:
+            density = max(0.0, random.gauss(35, 10))
+            msg = {"sensor_id": sid, "density": density}
+            t0 = time.perf_counter()
+            writer.write((json.dumps(msg) + "\n").encode())
+            await writer.drain()
+            ack = await reader.readline()
+            if not ack:
+                alive = False
+                break
+            lat.append(time.perf_counter() - t0)
+            await asyncio.sleep(interval)
+    except (OSError, asyncio.IncompleteReadError):
+        alive = False
+    finally:
+        if alive:
+            stats["sustained"] += 1
+        else:
+            stats["dropped"] += 1
+        writer.close()
+
+async def watch_rss(pid, stop_at, stats):
+    # keep the peak server RSS seen while sensors are connected
+    while time.time() < stop_at:
+        mb = rss_mb(pid)
+        if mb is not None:
+            stats["peak_rss_mb"] = max(stats["peak_rss_mb"], mb)
+        await asyncio.sleep(0.25)
+
+async def run_load(n, duration, interval, ramp, pid=None):
+    lat = []
+    stats = {"connected": 0, "connect_failed": 0, "sustained": 0, "dropped": 0, "peak_rss_mb": 0.0}
+    stop_at = time.time() + duration
+    if pid:
+        watcher = asyncio.create_task(watch_rss(pid, stop_at, stats))
+    tasks = []
+    for i in range(n):
+        tasks.append(asyncio.create_task(sensor(f"L-{i:05d}", stop_at, interval, lat, stats)))
+        if ramp and i % 100 == 99:
+            await asyncio.sleep(ramp)
+    await asyncio.gather(*tasks)
+    if pid:
+        await watcher
+    return lat, stats
+
+def wait_for_port(timeout=5.0):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((HOST, PORT), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+def bench(mode, args):
+    proc = None
+    pid = args.server_pid
+    if mode != "none":
+        cmd = [sys.executable, os.path.join(HERE, "server.py"), "--mode", mode]
+        if mode == "sharded":
+            cmd += ["--shards", str(args.shards)]
+        proc = subprocess.Popen(cmd,
+                                cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        pid = proc.pid
+        if not wait_for_port():
+            proc.kill()
+            raise SystemExit(f"[load] server ({mode}) did not start")
+    try:
+        idle_rss = rss_mb(pid) if pid else None
+        lat, stats = asyncio.run(run_load(args.sensors, args.duration, args.interval, args.ramp, pid))
+    finally:
+        if proc:
+            proc.kill()
+            proc.wait()
+    lat.sort()
+    result = {
+        "mode": mode,
+        "sensors": args.sensors,
+        "connected": stats["connected"],
+        "sustained": stats["sustained"],
+        "dropped": stats["dropped"],
+        "connect_failed": stats["connect_failed"],
+        "acks": len(lat),
+        "p50_ms": round(percentile(lat, 50) * 1e3, 3),
+        "p99_ms": round(percentile(lat, 99) * 1e3, 3),
+        "rss_idle_mb": idle_rss and round(idle_rss, 1),
+        "rss_peak_mb": round(stats["peak_rss_mb"], 1) if pid else None,
+    }
+    print(json.dumps(result))
+    return result
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sensors", type=int, default=1000, help="concurrent sensor connections")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds each sensor keeps sending")
+    ap.add_argument("--interval", type=float, default=0.5, help="seconds between readings per sensor")
+    ap.add_argument("--ramp", type=float, default=0.01, help="pause after every 100 connects")
+    ap.add_argument("--mode", choices=["threaded", "async", "sharded", "both", "all", "none"], default="both",
+                    help="server mode to spawn, or none to hit a server that is already running")
+    ap.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="workers for --mode sharded")
+    ap.add_argument("--server-pid", type=int, default=None, help="pid for RSS when --mode none")
+    args = ap.parse_args()
+    raise_fd_limit()
+    modes = {"both": ["threaded", "async"], "all": ["threaded", "async", "sharded"]}.get(args.mode, [args.mode])
+    for mode in modes:
+        bench(mode, args)
+
+if __name__ == "__main__":
+    main()
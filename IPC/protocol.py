@@ -0,0 +1,197 @@
+#line protocol shared by server.py and ../peer_p2p.py
+#
+#old clients (sensor.py before batching) send one reading per line and get one ack per line:
+#    -> {"sensor_id": "S-001", "density": 31.2}
+#    <- {"ok": true, "rolling_avg_30s": 33.9}
+#
+#new clients number their readings and may pack several per line (a frame), keeping up
+#to W readings unacked. seq is the number of the LAST reading in the frame:
+#    -> {"sensor_id": "S-001", "seq": 7, "readings": [30.1, 36.4, 29.8]}
+#    -> {"sensor_id": "S-001", "seq": 8, "density": 31.2}
+#everything read in one go is applied under one lock and answered with one cumulative ack
+#meaning "every reading up to seq has been received":
+#    <- {"ok": true, "rolling_avg_30s": 33.9, "ack": 8, "count": 4}
+#
+#dashboards send {"query": "sensor" | "region" | "top", ...} lines on the same connection
+#and get one json line back, see keyed_stats.DensityStats.query
+#
+#a client may instead open with codec.HELLO_LINE and switch the connection to the binary
+#frames in codec.py; batches then get one binary ACK frame. json stays the default.
+#
+#a json line longer than MAX_LINE gets {"ok": false, "error": ...} and the session is
+#closed (Session.closed): the caller sends the reply and drops the connection. binary
+#frames are capped by codec.MAX_FRAME instead.
+import json, time
+from contextlib import nullcontext
+import codec
+
+READ_SIZE = 65536
+MAX_LINE = 65536    # longest json line a connection may buffer
+
+#split a receive buffer into complete lines and the unfinished tail
+def split_lines(buf):
+    if b"\n" not in buf:
+        return [], buf
+    *lines, rest = buf.split(b"\n")
+    return [l for l in lines if l.strip()], rest
+
+def _densities(msg):
+    if "readings" in msg:
+        return [float(d) for d in msg["readings"]]
+    return [float(msg["density"])]
+
+def _reply(obj):
+    return (json.dumps(obj) + "\n").encode()
+
+#apply every line of one read to the window and build the bytes to send back
+#lock may be None when the caller is single threaded (asyncio)
+#stats (keyed_stats.DensityStats) is optional; with it readings are also recorded per
+#sensor/region and {"query": ...} lines are answered in place
+def handle_batch(lines, window, lock=None, stats=None):
+    parsed = []
+    for line in lines:
+        msg = None
+        try:
+            msg = json.loads(line.decode().strip())
+            if stats is not None and "query" in msg:
+                parsed.append((None, None, None, msg))
+            else:
+                parsed.append((msg.get("seq"), _densities(msg), None, msg))
+        except Exception as e:
+            seq = None
+            if isinstance(msg, dict):
+                seq = msg.get("seq")
+            parsed.append((seq, None, e, None))
+
+    out = []
+    ack_seq, ack_count = None, 0
+    now = time.time()
+    with (lock or nullcontext()):
+        for seq, densities, err, msg in parsed:
+            if err is not None:
+                e = {"ok": False, "error": str(err)}
+                if seq is not None:
+                    e["seq"] = seq
+                out.append(_reply(e))
+                continue
+            if densities is None:
+                out.append(_reply(_answer(stats, msg, now)))
+                continue
+            for d in densities:
+                window.add(d, now)
+            if stats is not None:
+                sid, region = msg.get("sensor_id"), msg.get("region")
+                for d in densities:
+                    stats.record(sid, d, now, region)
+            if seq is None:
+                # legacy client: one ack per line, unchanged format
+                out.append(_reply({"ok": True, "rolling_avg_30s": window.avg()}))
+            else:
+                ack_seq = seq if ack_seq is None else max(ack_seq, seq)
+                ack_count += len(densities)
+        if ack_seq is not None:
+            out.append(_reply({"ok": True, "rolling_avg_30s": window.avg(),
+                               "ack": ack_seq, "count": ack_count}))
+    return b"".join(out)
+
+def _answer(stats, msg, now):
+    try:
+        return stats.query(msg, now)
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+#same as handle_batch for decoded binary frames, answered with one ACK frame
+def handle_binary_batch(frames, window, lock=None, stats=None):
+    out = []
+    ack_seq, ack_count = None, 0
+    now = time.time()
+    with (lock or nullcontext()):
+        for frame in frames:
+            if frame[0] == codec.READING:
+                _, seq, _, density, sid = frame
+                window.add(density, now)
+                if stats is not None:
+                    stats.record(sid, density, now)
+                ack_seq = seq if ack_seq is None else max(ack_seq, seq)
+                ack_count += 1
+            elif frame[0] == codec.GENERIC:
+                msg = frame[1]
+                if stats is not None and isinstance(msg, dict) and "query" in msg:
+                    out.append(codec.encode_generic(_answer(stats, msg, now)))
+                    continue
+                try:
+                    densities = _densities(msg)
+                except Exception as e:
+                    out.append(codec.encode_generic({"ok": False, "error": str(e)}))
+                    continue
+                for d in densities:
+                    window.add(d, now)
+                    if stats is not None:
+                        stats.record(msg.get("sensor_id"), d, now, msg.get("region"))
+                seq = msg.get("seq", 0)
+                ack_seq = seq if ack_seq is None else max(ack_seq, seq)
+                ack_count += len(densities)
+        if ack_seq is not None:
+            out.append(codec.encode_ack(window.avg(), ack_seq, ack_count))
+    return b"".join(out)
+
+#per-connection state: receive buffer plus the codec picked by the client's first line
+class Session:
+    def __init__(self, window, lock=None, stats=None):
+        self.window = window
+        self.lock = lock
+        self.stats = stats
+        self.codec = codec.CODEC_JSON
+        self.negotiated = False
+        self.closed = False     # line too long: send what feed() returned, then hang up
+        self.parts = []         # unfinished input, in the chunks it arrived in
+        self.pending = 0        # bytes in parts
+
+    #feed raw bytes from the socket, returns the bytes to write back (maybe empty)
+    def feed(self, data):
+        if self.codec == codec.CODEC_JSON and b"\n" not in data:
+            #no line finished (the kept tail never holds a newline): just keep the chunk,
+            #joining on every read would copy a long line over and over
+            self.parts.append(data)
+            self.pending += len(data)
+            return self._check_line()
+        tail = self.pending
+        self.parts.append(data)
+        buf = b"".join(self.parts)
+        out = b""
+        if not self.negotiated:
+            nl = buf.find(b"\n", tail)
+            self.negotiated = True
+            first = buf[:nl]
+            try:
+                hello = json.loads(first)
+            except ValueError:
+                hello = None
+            if isinstance(hello, dict) and hello.get("codec") == codec.CODEC_BIN:
+                self.codec = codec.CODEC_BIN
+                out = _reply({"ok": True, "codec": codec.CODEC_BIN})
+                buf = buf[nl + 1:]
+        if self.codec == codec.CODEC_BIN:
+            frames, rest = codec.decode_frames(buf)
+            self._keep(rest)
+            if frames:
+                out += handle_binary_batch(frames, self.window, self.lock, self.stats)
+        else:
+            lines, rest = split_lines(buf)
+            self._keep(rest)
+            if lines:
+                out += handle_batch(lines, self.window, self.lock, self.stats)
+            out += self._check_line()
+        return out
+
+    def _keep(self, rest):
+        self.parts = [rest] if rest else []
+        self.pending = len(rest)
+
+    #an unfinished line past MAX_LINE: stop buffering it and close the session
+    def _check_line(self):
+        if self.pending <= MAX_LINE:
+            return b""
+        self._keep(b"")
+        self.closed = True
+        return _reply({"ok": False, "error": f"line longer than {MAX_LINE} bytes"})
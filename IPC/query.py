@@ -0,0 +1,31 @@
+#asks server.py (or a peer) for windowed stats and prints the json answer
+#usage: python query.py top [--k 5] [--window 30] [--by sensor|region]
+#       python query.py sensor S-001
+#       python query.py region north
+#       python query.py top --port 5001   (a peer_p2p.py node)
+import argparse, json, socket
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("kind", choices=["top", "sensor", "region"])
+    ap.add_argument("key", nargs="?", help="sensor_id or region for sensor/region queries")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--window", type=int, default=30, help="5, 30 or 300 seconds")
+    ap.add_argument("--by", choices=["sensor", "region"], default="sensor")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9009)
+    args = ap.parse_args()
+
+    if args.kind == "top":
+        q = {"query": "top", "k": args.k, "window": args.window, "by": args.by}
+    elif args.kind == "sensor":
+        q = {"query": "sensor", "sensor_id": args.key}
+    else:
+        q = {"query": "region", "region": args.key}
+    with socket.create_connection((args.host, args.port)) as s:
+        f = s.makefile("rwb", buffering=0)
+        f.write((json.dumps(q) + "\n").encode())
+        print(json.dumps(json.loads(f.readline()), indent=2))
+
+if __name__ == "__main__":
+    main()
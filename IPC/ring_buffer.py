@@ -0,0 +1,109 @@
+#compact (timestamp, value) storage for the rolling window
+#two preallocated array('d') columns used as a ring, so each sample costs 16 bytes
+#instead of a tuple + two floats (~100 bytes) in a deque
+from array import array
+
+INITIAL_CAPACITY = 1024
+
+
+class RingBuffer:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        cap = 1
+        while cap < max(1, capacity):
+            cap *= 2
+        self.ts = array("d", bytes(8 * cap))
+        self.vals = array("d", bytes(8 * cap))
+        self.head = 0   # physical index of the oldest sample
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for ts_seg, val_seg in self.views():
+            yield from zip(ts_seg, val_seg)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("ring buffer index out of range")
+        j = (self.head + i) & (len(self.ts) - 1)
+        return self.ts[j], self.vals[j]
+
+    @property
+    def capacity(self):
+        return len(self.ts)
+
+    def append(self, ts, value):
+        if self.size == len(self.ts):
+            self._grow()
+        j = (self.head + self.size) & (len(self.ts) - 1)
+        self.ts[j] = ts
+        self.vals[j] = value
+        self.size += 1
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    #drop every sample with now - ts > window. timestamps are appended in order so the
+    #cut point is found by galloping + binary search instead of popping one at a time.
+    #returns memoryviews of the evicted values; they stay valid until the next append
+    def evict(self, now, window):
+        size = self.size
+        mask = len(self.ts) - 1
+        ts = self.ts
+        head = self.head
+        if not size or now - ts[head] <= window:
+            return []
+        # gallop: steady state evicts one or two samples, so keep the search local
+        lo, step = 1, 1
+        while lo < size and now - ts[(head + lo) & mask] > window:
+            lo += step
+            step *= 2
+        # index lo - step // 2 is known expired, the cut lies in (that, hi]
+        hi = min(lo, size)
+        lo = lo - step // 2 + 1 if step > 1 else 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if now - ts[(head + mid) & mask] > window:
+                lo = mid + 1
+            else:
+                hi = mid
+        segs = self._segments(self.vals, 0, lo)
+        self.head = (head + lo) & mask
+        self.size -= lo
+        return segs
+
+    #zero-copy views over the live samples, one or two segments depending on wrap-around
+    def views(self):
+        return list(zip(self._segments(self.ts, 0, self.size),
+                        self._segments(self.vals, 0, self.size)))
+
+    def value_views(self):
+        return self._segments(self.vals, 0, self.size)
+
+    def nbytes(self):
+        return len(self.ts) * self.ts.itemsize + len(self.vals) * self.vals.itemsize
+
+    def _segments(self, col, start, count):
+        if count == 0:
+            return []
+        cap = len(col)
+        mv = memoryview(col)
+        a = (self.head + start) & (cap - 1)
+        if a + count <= cap:
+            return [mv[a:a + count]]
+        return [mv[a:], mv[:a + count - cap]]
+
+    #double the capacity and unroll the ring so the oldest sample is at index 0
+    def _grow(self):
+        cap = len(self.ts)
+        for name in ("ts", "vals"):
+            old = getattr(self, name)
+            new = array("d", bytes(16 * cap))
+            live = old[self.head:] + old[:self.head]
+            new[:cap] = live
+            setattr(self, name, new)
+        self.head = 0
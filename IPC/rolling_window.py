@@ -0,0 +1,108 @@
+#incremental rolling window shared by server.py, server_udp.py and peer_p2p.py
+#keeps a running sum/count so add() and avg() are O(1) amortized instead of
+#summing the whole window on every reading
+import time
+from collections import deque
+from ring_buffer import RingBuffer
+
+WINDOW = 30  # seconds
+
+
+class RollingWindow:
+    def __init__(self, window_sec=WINDOW, track_minmax=False, track_var=False):
+        self.window = window_sec
+        self.samples = RingBuffer()   # (ts, value) columns, 16 bytes per sample
+        self.total = 0.0
+        self.track_minmax = track_minmax
+        self.track_var = track_var
+        # monotonic deques: front is always the current min / max
+        self._mins = deque()     # (ts, value), values increasing
+        self._maxs = deque()     # (ts, value), values decreasing
+        # welford running mean / sum of squared diffs
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self.samples)
+
+    #drop samples older than the window and undo them from the running stats
+    def evict(self, now=None):
+        if now is None:
+            now = time.time()
+        samples = self.samples
+        n = samples.size
+        for seg in samples.evict(now, self.window):
+            self.total -= sum(seg)
+            if self.track_var:
+                for v in seg:
+                    n -= 1
+                    self._welford_remove(v, n)
+        if self.track_minmax:
+            while self._mins and now - self._mins[0][0] > self.window:
+                self._mins.popleft()
+            while self._maxs and now - self._maxs[0][0] > self.window:
+                self._maxs.popleft()
+        if not samples.size:
+            # reset so float drift never outlives an empty window
+            self.total = 0.0
+            self._mean = 0.0
+            self._m2 = 0.0
+
+    def add(self, value, now=None):
+        if now is None:
+            now = time.time()
+        value = float(value)
+        self.evict(now)
+        self.samples.append(now, value)
+        self.total += value
+        if self.track_var:
+            self._welford_add(value)
+        if self.track_minmax:
+            while self._mins and self._mins[-1][1] >= value:
+                self._mins.pop()
+            self._mins.append((now, value))
+            while self._maxs and self._maxs[-1][1] <= value:
+                self._maxs.pop()
+            self._maxs.append((now, value))
+
+    def avg(self, now=None):
+        if now is not None:
+            self.evict(now)
+        if not self.samples:
+            return 0.0
+        return self.total / len(self.samples)
+
+    def min(self):
+        if not self.track_minmax:
+            raise RuntimeError("min/max tracking is disabled")
+        return self._mins[0][1] if self._mins else None
+
+    def max(self):
+        if not self.track_minmax:
+            raise RuntimeError("min/max tracking is disabled")
+        return self._maxs[0][1] if self._maxs else None
+
+    #population variance of the samples currently in the window
+    def variance(self):
+        if not self.track_var:
+            raise RuntimeError("variance tracking is disabled")
+        n = len(self.samples)
+        if n < 2:
+            return 0.0
+        return max(0.0, self._m2 / n)
+
+    def _welford_add(self, x):
+        n = len(self.samples)  # already includes x
+        d = x - self._mean
+        self._mean += d / n
+        self._m2 += d * (x - self._mean)
+
+    def _welford_remove(self, x, n):
+        # n is the count left after removing x
+        if n == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        d = x - self._mean
+        self._mean -= d / n
+        self._m2 -= d * (x - self._mean)
@@ -1,27 +1,152 @@
 #sends random density readings and prints server acks
+#default is the original one reading -> one ack loop. with --batch/--window the sensor
+#packs readings into frames and keeps up to W readings unacked (see protocol.py)
+#--codec bin switches the connection to the binary frames in codec.py after a hello line
+#usage: python sensor.py S-001 [--batch 10] [--window 100] [--interval 0.5] [--codec bin]
 
-import json, random, socket, sys, time
+import argparse, json, random, socket, threading, time
+import codec
 
 HOST, PORT = "127.0.0.1", 9009
-SID = sys.argv[1] if len(sys.argv) > 1 else "S-001"
 
-def main():
-    sock = socket.create_connection((HOST, PORT))
+def reading():
+    return max(0.0, random.gauss(35, 10))
+
+def run_simple(sock, sid, interval, region=None):
     f = sock.makefile("rwb", buffering=0)
-    print(f"[tcp] {SID} connected")
+    while True:
+        msg = {"sensor_id": sid, "density": reading()}
+        if region:
+            msg["region"] = region
+        f.write((json.dumps(msg) + "\n").encode())
+        ack = f.readline().decode().strip()
+        if ack:
+            print(f"[tcp] {sid} <- {ack}")
+        time.sleep(interval)
+
+class AckWindow:
+    # tracks the highest cumulative ack so the sender can block once W readings are in flight
+    def __init__(self, size):
+        self.size = size
+        self.acked = 0
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def wait_room(self, sent):
+        with self.cond:
+            while not self.closed and sent - self.acked >= self.size:
+                self.cond.wait()
+            return not self.closed
+
+    def update(self, seq):
+        with self.cond:
+            if seq > self.acked:
+                self.acked = seq
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+def ack_reader(sock, sid, win):
+    f = sock.makefile("rb")
+    try:
+        for line in f:
+            ack = json.loads(line)
+            if "ack" in ack:
+                win.update(int(ack["ack"]))
+            print(f"[tcp] {sid} <- {line.decode().strip()}")
+    except (OSError, ValueError):
+        pass
+    finally:
+        win.close()
+
+def run_pipelined(sock, sid, interval, batch, window, region=None):
+    win = AckWindow(max(window, batch))
+    threading.Thread(target=ack_reader, args=(sock, sid, win), daemon=True).start()
+    seq = 0
+    while True:
+        readings = [reading() for _ in range(batch)]
+        if not win.wait_room(seq + len(readings) - 1):
+            break
+        seq += len(readings)
+        if batch == 1:
+            msg = {"sensor_id": sid, "seq": seq, "density": readings[0]}
+        else:
+            msg = {"sensor_id": sid, "seq": seq, "readings": readings}
+        if region:
+            msg["region"] = region
+        sock.sendall((json.dumps(msg) + "\n").encode())
+        if interval:
+            time.sleep(interval)
+
+def binary_ack_reader(sock, sid, win):
+    buf = b""
     try:
         while True:
-            density = max(0.0, random.gauss(35, 10))
-            msg = {"sensor_id": SID, "density": density}
-            f.write((json.dumps(msg) + "\n").encode())
-            ack = f.readline().decode().strip()
-            if ack:
-                print(f"[tcp] {SID} <- {ack}")
-            time.sleep(0.5)
+            data = sock.recv(65536)
+            if not data:
+                break
+            frames, buf = codec.decode_frames(buf + data)
+            for frame in frames:
+                if frame[0] == codec.ACK:
+                    _, ok, seq, count, avg = frame
+                    win.update(seq)
+                    print(f"[tcp] {sid} <- ack={seq} count={count} rolling_avg_30s={avg:.3f}")
+                else:
+                    print(f"[tcp] {sid} <- {frame[1:]}")
+    except (OSError, ValueError):
+        pass
+    finally:
+        win.close()
+
+def run_binary(sock, sid, interval, batch, window):
+    sock.sendall(codec.HELLO_LINE)
+    f = sock.makefile("rb", buffering=0)
+    reply = json.loads(f.readline())
+    if reply.get("codec") != codec.CODEC_BIN:
+        raise SystemExit(f"[tcp] server refused binary codec: {reply}")
+    win = AckWindow(max(window, batch))
+    threading.Thread(target=binary_ack_reader, args=(sock, sid, win), daemon=True).start()
+    sid_b = sid.encode()
+    seq = 0
+    while True:
+        if not win.wait_room(seq + batch - 1):
+            break
+        frames = []
+        now = time.time()
+        for _ in range(batch):
+            seq += 1
+            frames.append(codec.encode_reading(sid_b, reading(), now, seq))
+        sock.sendall(b"".join(frames))
+        if interval:
+            time.sleep(interval)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sid", nargs="?", default="S-001", help="sensor id")
+    ap.add_argument("--batch", type=int, default=1, help="readings per frame")
+    ap.add_argument("--window", type=int, default=0,
+                    help="max unacked readings in flight (0 = wait for every ack, old protocol)")
+    ap.add_argument("--interval", type=float, default=0.5, help="seconds between frames")
+    ap.add_argument("--codec", choices=[codec.CODEC_JSON, "bin"], default=codec.CODEC_JSON,
+                    help="wire format, json lines (default) or binary frames")
+    ap.add_argument("--region", default=None, help="optional region tag for per-region stats (json only)")
+    args = ap.parse_args()
+
+    sock = socket.create_connection((HOST, PORT))
+    print(f"[tcp] {args.sid} connected")
+    try:
+        if args.codec == "bin":
+            run_binary(sock, args.sid, args.interval, max(1, args.batch), max(1, args.window))
+        elif args.window or args.batch > 1:
+            run_pipelined(sock, args.sid, args.interval, max(1, args.batch), args.window, args.region)
+        else:
+            run_simple(sock, args.sid, args.interval, args.region)
     finally:
         try: sock.close()
         except: pass
 
 if __name__ == "__main__":
     main()
-
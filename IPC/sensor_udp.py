@@ -1,23 +1,66 @@
 #sends density every .5s and prints ack
+#--flood N fires N readings back to back without waiting, then asks the server for stats
+#usage: python sensor_udp.py U-001 [--codec bin] [--flood 100000]
 
-import json, random, socket, sys, time
+import argparse, json, random, socket, time
+import codec
 
 HOST, PORT = "127.0.0.1", 9010
-SID = sys.argv[1] if len(sys.argv) > 1 else "U-001"
+
+def flood(s, sid, binary, n):
+    t0 = time.perf_counter()
+    for seq in range(1, n + 1):
+        density = max(0.0, random.gauss(35, 10))
+        if binary:
+            s.sendto(codec.encode_reading(sid, density, 0.0, seq), (HOST, PORT))
+        else:
+            s.sendto(json.dumps({"sensor_id": sid, "density": density}).encode(), (HOST, PORT))
+    dt = time.perf_counter() - t0
+    print(f"[udp] {sid} sent {n} readings in {dt:.2f}s ({n / dt:.0f}/s)")
+    # acks (if any) are ignored; ask for the merged stats instead
+    s.setblocking(True)
+    s.settimeout(1.0)
+    time.sleep(1.5)
+    s.sendto(json.dumps({"query": "stats"}).encode(), (HOST, PORT))
+    try:
+        while True:
+            data, _ = s.recvfrom(65536)
+            if not codec.is_binary_datagram(data) and b'"workers"' in data:
+                print(f"[udp] stats <- {data.decode().strip()}")
+                break
+    except socket.timeout:
+        print("[udp] no stats reply (server not in --batch mode?)")
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sid", nargs="?", default="U-001", help="sensor id")
+    ap.add_argument("--codec", choices=[codec.CODEC_JSON, "bin"], default=codec.CODEC_JSON)
+    ap.add_argument("--flood", type=int, default=0, help="send N readings as fast as possible")
+    args = ap.parse_args()
+    sid, binary = args.sid, args.codec == "bin"
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    print(f"[udp] {SID} started")
+    if args.flood:
+        flood(s, sid, binary, args.flood)
+        return
+    print(f"[udp] {sid} started ({'bin' if binary else 'json'})")
+    seq = 0
     while True:
         density = max(0.0, random.gauss(35, 10))
-        msg = {"sensor_id": SID, "density": density}
-        s.sendto(json.dumps(msg).encode(), (HOST, PORT))
+        if binary:
+            seq += 1
+            s.sendto(codec.encode_reading(sid, density, time.time(), seq), (HOST, PORT))
+        else:
+            msg = {"sensor_id": sid, "density": density}
+            s.sendto(json.dumps(msg).encode(), (HOST, PORT))
         try:
             s.settimeout(1.0)
             data, _ = s.recvfrom(4096)
-            print(f"[udp] {SID} <- {data.decode().strip()}")
+            if codec.is_binary_datagram(data):
+                print(f"[udp] {sid} <- {codec.decode_frames(data)[0]}")
+            else:
+                print(f"[udp] {sid} <- {data.decode().strip()}")
         except socket.timeout:
-            print(f"[udp] {SID} no ack (ok for udp)")
+            print(f"[udp] {sid} no ack (ok for udp)")
         time.sleep(0.5)
 
 if __name__ == "__main__":
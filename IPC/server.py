@@ -1,65 +1,113 @@
 #accepts multiple sensor clients and keeps a 30s rolling avg of density
-import json, socket, threading, time
-from collections import deque
+#modes: "threaded" (one thread per sensor, the original), "async" (one asyncio event
+#loop for every connection, no per-connection thread stacks) and "sharded" (sensors
+#hashed across worker processes, see sharded.py)
+#readings may arrive one per line, batched/pipelined with cumulative acks, or as binary
+#frames after a codec hello, see protocol.py and codec.py
+#usage: python server.py [--mode threaded|async|sharded] [--shards N]
+import argparse, asyncio, os, socket, threading
+from keyed_stats import DensityStats
+from rolling_window import RollingWindow
+from protocol import READ_SIZE, Session
 
 HOST, PORT = "127.0.0.1", 9009
 WINDOW = 30  # seconds
 
-samples = deque()       # (timestamp, density)
-lock = threading.Lock() # protect samples
+samples = RollingWindow(WINDOW)  # running sum/count over (timestamp, density)
+stats = DensityStats()  # per-sensor / per-region 5s, 30s, 5min windows for queries
+lock = threading.Lock() # protect samples and stats
 
 def clean_old(now):
     # remove samples older than 30s
-    while samples and now - samples[0][0] > WINDOW:
-        samples.popleft()
+    samples.evict(now)
 
 def avg_30s():
-    # compute average over current window
-    if not samples:
-        return 0.0
-    total = sum(d for _, d in samples)
-    return total / len(samples)
+    # running average over current window, O(1)
+    return samples.avg()
 
 def handle(conn, addr):
     print("[tcp] connected", addr)
-    f = conn.makefile("rwb", buffering=0)
+    session = Session(samples, lock, stats)
     try:
         while True:
-            line = f.readline()
-            if not line:
+            data = conn.recv(READ_SIZE)
+            if not data:
                 break
-            try:
-                msg = json.loads(line.decode().strip())
-                density = float(msg["density"])
-                now = time.time()
-                with lock:
-                    clean_old(now)
-                    samples.append((now, density))
-                    a = avg_30s()
-                reply = {"ok": True, "rolling_avg_30s": a}
-                f.write((json.dumps(reply) + "\n").encode())
-            except Exception as e:
-                f.write((json.dumps({"ok": False, "error": str(e)}) + 
-"\n").encode())
+            # everything complete in this read is one batch: one lock, one write
+            out = session.feed(data)
+            if out:
+                conn.sendall(out)
+            if session.closed:
+                break
+    except (ConnectionError, ValueError):
+        # ValueError: corrupt binary frame, nothing sane to resync on
+        pass
     finally:
         print("[tcp] disconnected", addr)
         try: conn.close()
         except: pass
 
-def main():
+def serve_threaded():
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     s.bind((HOST, PORT))
-    s.listen()
-    print(f"[tcp] listening on {HOST}:{PORT}")
+    s.listen(socket.SOMAXCONN)
+    print(f"[tcp] listening on {HOST}:{PORT} (threaded)")
     try:
         while True:
             conn, addr = s.accept()
-            threading.Thread(target=handle, args=(conn, addr), 
+            threading.Thread(target=handle, args=(conn, addr),
 daemon=True).start()
     finally:
         s.close()
 
+async def handle_async(reader, writer):
+    addr = writer.get_extra_info("peername")
+    print("[tcp] connected", addr)
+    session = Session(samples, stats=stats)  # single event loop thread, so no lock needed
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            out = session.feed(data)
+            if out:
+                writer.write(out)
+                await writer.drain()
+            if session.closed:
+                break
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        print("[tcp] disconnected", addr)
+        writer.close()
+        try: await writer.wait_closed()
+        except Exception: pass
+
+async def serve_async():
+    server = await asyncio.start_server(handle_async, HOST, PORT,
+                                        reuse_address=True, backlog=socket.SOMAXCONN)
+    print(f"[tcp] listening on {HOST}:{PORT} (async)")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["threaded", "async", "sharded"], default="threaded",
+                    help="one thread per sensor, a single asyncio event loop, or worker processes")
+    ap.add_argument("--shards", type=int, default=os.cpu_count() or 1,
+                    help="worker processes for --mode sharded")
+    args = ap.parse_args()
+    if args.mode == "sharded":
+        import sharded
+        sharded.serve(HOST, PORT, max(1, args.shards), WINDOW)
+    elif args.mode == "async":
+        try:
+            asyncio.run(serve_async())
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve_threaded()
+
 if __name__ == "__main__":
     main()
-
@@ -1,37 +1,198 @@
 #listens for density packets and sends back rolling avg 
-import json, socket, time
-from collections import deque
+#json datagrams get a json ack, binary datagrams (codec.py) get a binary ACK frame
+#
+#--batch switches to the high-throughput ingest loop: a non-blocking socket drained up to
+#N datagrams at a time into one preallocated buffer, one coalesced ack per sender per
+#batch (or none with --no-ack), and optionally --workers N processes sharing the port
+#through SO_REUSEPORT, each with its own shard of the window. shards publish their
+#sum/count to shared memory so any worker can answer {"query": "stats"} for the whole set
+#usage: python server_udp.py [--batch 256] [--workers 4] [--no-ack] [--rcvbuf 8388608]
+import argparse, json, multiprocessing, os, select, socket, time
+import codec
+from protocol import handle_binary_batch
+from rolling_window import RollingWindow
 
 HOST, PORT = "127.0.0.1", 9010
 WINDOW = 30
-samples = deque()
+samples = RollingWindow(WINDOW)
 
 def clean_old(now):
-    while samples and now - samples[0][0] > WINDOW:
-        samples.popleft()
+    samples.evict(now)
 
 def avg_30s():
-    if not samples:
-        return 0.0
-    return sum(d for _, d in samples) / len(samples)
+    return samples.avg()
 
-def main():
+def handle_datagram(data):
+    # returns the reply datagram for one received datagram
+    if codec.is_binary_datagram(data):
+        try:
+            frames, _ = codec.decode_frames(data)
+            return handle_binary_batch(frames, samples)
+        except Exception as e:
+            return codec.encode_generic({"ok": False, "error": str(e)})
+    try:
+        msg = json.loads(data.decode().strip())
+        density = float(msg["density"])
+        now = time.time()
+        samples.add(density, now)
+        reply = {"ok": True, "rolling_avg_30s": avg_30s()}
+    except Exception as e:
+        reply = {"ok": False, "error": str(e)}
+    return (json.dumps(reply) + "\n").encode()
+
+def serve_simple():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.bind((HOST, PORT))
     print(f"[udp] listening on {HOST}:{PORT}")
     while True:
         data, addr = s.recvfrom(4096)
-        try:
-            msg = json.loads(data.decode().strip())
-            density = float(msg["density"])
-            now = time.time()
-            clean_old(now)
-            samples.append((now, density))
-            reply = {"ok": True, "rolling_avg_30s": avg_30s()}
-            s.sendto((json.dumps(reply) + "\n").encode(), addr)
-        except Exception as e:
-            s.sendto((json.dumps({"ok": False, "error": str(e)}) + 
-"\n").encode(), addr)
+        reply = handle_datagram(data)
+        if reply:
+            s.sendto(reply, addr)
+
+# batched ingest
+
+MAX_DATAGRAM = 65536
+STATS_FIELDS = 5  # per worker slot in shared memory: sum, count, pkts/sec, kernel drops, bad packets
+S_SUM, S_COUNT, S_PPS, S_DROPS, S_BAD = range(STATS_FIELDS)
+
+def kernel_drops(sock):
+    # linux: the last column of /proc/net/udp is the per-socket drop counter
+    try:
+        inode = str(os.fstat(sock.fileno()).st_ino)
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                cols = line.split()
+                if cols[9] == inode:
+                    return int(cols[-1])
+    except (OSError, IndexError, ValueError, StopIteration):
+        pass
+    return 0
+
+def merged(stats, workers):
+    total = sum(stats[i * STATS_FIELDS + S_SUM] for i in range(workers))
+    count = sum(stats[i * STATS_FIELDS + S_COUNT] for i in range(workers))
+    return total / count if count else 0.0
+
+def stats_reply(stats, workers):
+    per = []
+    for i in range(workers):
+        base = i * STATS_FIELDS
+        per.append({"worker": i, "samples": int(stats[base + S_COUNT]),
+                    "pkts_per_sec": round(stats[base + S_PPS], 1),
+                    "kernel_drops": int(stats[base + S_DROPS]), "bad": int(stats[base + S_BAD])})
+    return (json.dumps({"ok": True, "rolling_avg_30s": merged(stats, workers), "workers": per}) + "\n").encode()
+
+def open_socket(reuseport, rcvbuf):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuseport:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if rcvbuf:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    s.bind((HOST, PORT))
+    s.setblocking(False)
+    return s
+
+def batch_worker(wid, workers, stats, batch, ack, rcvbuf):
+    s = open_socket(workers > 1, rcvbuf)
+    shard = RollingWindow(WINDOW)
+    buf = bytearray(MAX_DATAGRAM)
+    view = memoryview(buf)
+    base = wid * STATS_FIELDS
+    pkts, bad, last_report = 0, 0, time.time()
+    print(f"[udp w{wid}] listening on {HOST}:{PORT} batch={batch} ack={ack}")
+    while True:
+        select.select([s], [], [], 1.0)
+        now = time.time()
+        # addr -> [json?, max seq, count] so each sender gets one ack per batch
+        pending = {}
+        queries = []
+        for _ in range(batch):
+            try:
+                n, addr = s.recvfrom_into(buf)
+            except BlockingIOError:
+                break
+            pkts += 1
+            data = view[:n]
+            try:
+                if codec.is_binary_datagram(data):
+                    frames, _ = codec.decode_frames(data)
+                    entry = pending.setdefault(addr, [False, 0, 0])
+                    for f in frames:
+                        if f[0] == codec.READING:
+                            shard.add(f[3], now)
+                            entry[1] = max(entry[1], f[1])
+                            entry[2] += 1
+                else:
+                    msg = json.loads(bytes(data))
+                    if "query" in msg:
+                        queries.append(addr)
+                        continue
+                    shard.add(float(msg["density"]), now)
+                    entry = pending.setdefault(addr, [True, 0, 0])
+                    entry[1] = max(entry[1], int(msg.get("seq", 0)))
+                    entry[2] += 1
+            except Exception:
+                bad += 1
+        shard.evict(now)
+        stats[base + S_SUM] = shard.total
+        stats[base + S_COUNT] = len(shard)
+
+        if ack and pending:
+            avg = merged(stats, workers)
+            for addr, (is_json, seq, count) in pending.items():
+                if is_json:
+                    reply = {"ok": True, "rolling_avg_30s": avg, "count": count}
+                    if seq:
+                        reply["ack"] = seq
+                    out = (json.dumps(reply) + "\n").encode()
+                else:
+                    out = codec.encode_ack(avg, seq, count)
+                try:
+                    s.sendto(out, addr)
+                except (BlockingIOError, OSError):
+                    pass
+        for addr in queries:
+            try:
+                s.sendto(stats_reply(stats, workers), addr)
+            except (BlockingIOError, OSError):
+                pass
+
+        if now - last_report >= 1.0:
+            stats[base + S_PPS] = pkts / (now - last_report)
+            stats[base + S_DROPS] = kernel_drops(s)
+            stats[base + S_BAD] = bad
+            print(f"[udp w{wid}] pkts/s={stats[base + S_PPS]:.0f} kernel_drops={int(stats[base + S_DROPS])} "
+                  f"bad={bad} shard={len(shard)} avg30(all)={merged(stats, workers):.2f}")
+            pkts, last_report = 0, now
+
+def serve_batched(batch, workers, ack, rcvbuf):
+    stats = multiprocessing.Array("d", workers * STATS_FIELDS, lock=False)
+    if workers == 1:
+        batch_worker(0, 1, stats, batch, ack, rcvbuf)
+        return
+    procs = [multiprocessing.Process(target=batch_worker, args=(i, workers, stats, batch, ack, rcvbuf),
+                                     daemon=True) for i in range(workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, default=0, help="drain up to N datagrams per wakeup (0 = one at a time)")
+    ap.add_argument("--workers", type=int, default=1, help="processes sharing the port via SO_REUSEPORT")
+    ap.add_argument("--no-ack", action="store_true", help="do not send acks in batch mode")
+    ap.add_argument("--rcvbuf", type=int, default=0, help="SO_RCVBUF in bytes (0 = kernel default)")
+    args = ap.parse_args()
+    if args.batch or args.workers > 1:
+        serve_batched(max(1, args.batch or 64), max(1, args.workers), not args.no_ack, args.rcvbuf)
+    else:
+        serve_simple()
 
 if __name__ == "__main__":
     main()
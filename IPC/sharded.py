@@ -0,0 +1,359 @@
+#sharded multi-process mode for server.py (python server.py --mode sharded --shards 4)
+#
+#the acceptor peeks at the first line of every new connection, hashes its sensor_id and
+#hands the socket itself to one of N worker processes (fd passing over a unix socketpair),
+#so parsing and window updates run on N cores instead of behind one GIL.
+#every worker keeps its own RollingWindow shard and publishes the shard's sum/count into a
+#shared_memory block. acks are built from the combined partials, so the reply is still the
+#global {"ok": true, "rolling_avg_30s": ...}. the acceptor prints the same combined value.
+#
+#{"query": ...} lines (keyed_stats.py): every worker records its readings in its own
+#DensityStats. a connection whose first line is a query stays in the acceptor, which asks
+#every worker for its partial sums over a pipe and merges them (DensityStats.merge), so a
+#top-k ranks keys by their average over all shards. a query sent on a sensor connection
+#gets an error, since that worker only knows its own shard.
+#unix only (socket.send_fds).
+import asyncio, itertools, json, multiprocessing, selectors, socket, time, zlib
+from multiprocessing import shared_memory
+from rolling_window import RollingWindow
+from keyed_stats import DensityStats
+from protocol import MAX_LINE, READ_SIZE, Session
+
+SLOT = 4            # doubles per shard: version, sum, count, spare
+PEEK_LIMIT = 4096   # give up routing a connection that sends this much without a newline
+PEEK_TIMEOUT = 5.0  # seconds a new connection may take to send its first line
+QUERY_TIMEOUT = 2.0 # seconds the acceptor waits for every shard's part of a query
+
+#shared partial aggregates, one seqlock-protected slot per shard
+class Partials:
+    def __init__(self, shards, name=None):
+        self.shards = shards
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=shards * SLOT * 8)
+            self.shm.buf[:] = bytes(len(self.shm.buf))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.cells = self.shm.buf.cast("d")
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # single writer per slot: odd version means a write is in progress
+    def publish(self, shard, total, count):
+        base = shard * SLOT
+        c = self.cells
+        c[base] += 1
+        c[base + 1] = total
+        c[base + 2] = count
+        c[base + 0] += 1
+
+    def read(self, shard):
+        base = shard * SLOT
+        c = self.cells
+        while True:
+            v1 = c[base]
+            total, count = c[base + 1], c[base + 2]
+            if v1 == c[base] and not int(v1) & 1:
+                return total, count
+
+    def combined_avg(self):
+        total = count = 0.0
+        for i in range(self.shards):
+            t, n = self.read(i)
+            total += t
+            count += n
+        return total / count if count else 0.0
+
+    def close(self, unlink=False):
+        self.cells.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+#a RollingWindow shard whose avg() is the global average across every shard
+class ShardWindow(RollingWindow):
+    def __init__(self, shard, partials, window_sec):
+        super().__init__(window_sec)
+        self.shard = shard
+        self.partials = partials
+
+    def publish(self):
+        self.partials.publish(self.shard, self.total, len(self))
+
+    def avg(self, now=None):
+        if now is not None:
+            self.evict(now)
+        self.publish()
+        return self.partials.combined_avg()
+
+#one shard's stats; queries are answered by the acceptor across all shards instead
+class ShardStats(DensityStats):
+    def query(self, msg, now=None):
+        return {"ok": False, "error": "sharded server: send queries on their own connection "
+                                      "(first line a query) to get every shard's data"}
+
+def shard_for(sensor_id, shards):
+    # crc32, not hash(): must agree across processes
+    return zlib.crc32(sensor_id.encode()) % shards
+
+# worker process
+
+async def _serve_conn(sock, window, stats):
+    reader, writer = await asyncio.open_connection(sock=sock)
+    session = Session(window, stats=stats)
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            out = session.feed(data)
+            if out:
+                writer.write(out)
+                await writer.drain()
+            if session.closed:
+                break
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def _worker_main(shard, ctrl, queries, partials, window_sec):
+    loop = asyncio.get_running_loop()
+    window = ShardWindow(shard, partials, window_sec)
+    stats = ShardStats()
+    ctrl.setblocking(False)
+    incoming = asyncio.Queue()
+
+    def on_ctrl():
+        try:
+            _, fds, _, _ = socket.recv_fds(ctrl, 16, 64)
+        except BlockingIOError:
+            return
+        if not fds:
+            loop.remove_reader(ctrl.fileno())
+            incoming.put_nowait(None)
+            return
+        for fd in fds:
+            incoming.put_nowait(fd)
+
+    loop.add_reader(ctrl.fileno(), on_ctrl)
+
+    # the acceptor asking for this shard's part of a query: (qid, msg) -> (qid, ok, data)
+    def on_query():
+        try:
+            qid, msg = queries.recv()
+        except (EOFError, OSError):
+            loop.remove_reader(queries.fileno())
+            return
+        try:
+            reply = (qid, True, stats.partial(msg, time.time()))
+        except Exception as e:
+            reply = (qid, False, str(e))
+        queries.send(reply)
+
+    loop.add_reader(queries.fileno(), on_query)
+
+    async def expire():
+        # keep the published partial fresh even when this shard gets no traffic
+        while True:
+            await asyncio.sleep(1.0)
+            window.evict(time.time())
+            window.publish()
+
+    expirer = asyncio.create_task(expire())
+    conns = set()  # the loop only keeps weak references to tasks
+    while True:
+        fd = await incoming.get()
+        if fd is None:
+            break
+        s = socket.socket(fileno=fd)
+        s.setblocking(False)
+        t = asyncio.create_task(_serve_conn(s, window, stats))
+        conns.add(t)
+        t.add_done_callback(conns.discard)
+    expirer.cancel()
+
+def worker(shard, ctrl, queries, shm_name, shards, window_sec):
+    partials = Partials(shards, shm_name)
+    try:
+        asyncio.run(_worker_main(shard, ctrl, queries, partials, window_sec))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        partials.close()
+
+# acceptor
+
+def _first_msg(first_line):
+    try:
+        msg = json.loads(first_line)
+    except ValueError:
+        return None
+    return msg if isinstance(msg, dict) else None
+
+def _route_key(msg, addr):
+    if msg is not None and "sensor_id" in msg:
+        return str(msg["sensor_id"])
+    # codec hello or junk: fall back to the peer address
+    return f"{addr[0]}:{addr[1]}"
+
+#asks every worker for its part of a query and merges them
+def _ask_shards(pipes, qid, msg):
+    try:
+        for q in pipes:
+            q.send((qid, msg))
+    except OSError:
+        return {"ok": False, "error": "a shard is gone"}
+    deadline = time.time() + QUERY_TIMEOUT
+    parts = []
+    for q in pipes:
+        while True:
+            if not q.poll(max(0.0, deadline - time.time())):
+                return {"ok": False, "error": "a shard did not answer in time"}
+            rid, ok, data = q.recv()
+            if rid == qid:
+                break   # older ids are late answers to a query that already timed out
+        if not ok:
+            return {"ok": False, "error": data}
+        parts.append(data)
+    return DensityStats.merge(msg, parts)
+
+#the reply bytes for the complete lines of a query connection
+def _answer_lines(lines, pipes, qids):
+    out = []
+    for line in lines:
+        if not line.strip():
+            continue
+        msg = _first_msg(line)
+        if msg is None or "query" not in msg:
+            reply = {"ok": False, "error": "sharded server: send readings on a sensor connection"}
+        else:
+            reply = _ask_shards(pipes, next(qids), msg)
+        out.append((json.dumps(reply) + "\n").encode())
+    return b"".join(out)
+
+def serve(host, port, shards, window_sec):
+    partials = Partials(shards)
+    ctrls, pipes, procs = [], [], []
+    for i in range(shards):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        qparent, qchild = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=worker, args=(i, child, qchild, partials.name, shards, window_sec),
+                                    daemon=True)
+        p.start()
+        child.close()
+        qchild.close()
+        ctrls.append(parent)
+        pipes.append(qparent)
+        procs.append(p)
+
+    lsock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    lsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    lsock.bind((host, port))
+    lsock.listen(socket.SOMAXCONN)
+    lsock.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(lsock, selectors.EVENT_READ, None)
+    pending = {}  # conn -> (addr, accepted_at)
+    querying = {}  # conn -> unfinished line, connections the acceptor answers itself
+    qids = itertools.count(1)
+    routed = [0] * shards
+    print(f"[tcp] listening on {host}:{port} (sharded, {shards} workers)")
+
+    def hand_off(conn, addr, key):
+        i = shard_for(key, shards)
+        socket.send_fds(ctrls[i], [b"c"], [conn.fileno()])
+        routed[i] += 1
+        conn.close()  # the worker owns its own copy of the fd now
+
+    def close_query(conn):
+        sel.unregister(conn)
+        del querying[conn]
+        conn.close()
+
+    def serve_query(conn):
+        try:
+            data = conn.recv(READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            close_query(conn)
+            return
+        *lines, rest = (querying[conn] + data).split(b"\n")
+        out = _answer_lines(lines, pipes, qids)
+        too_long = len(rest) > MAX_LINE
+        if too_long:
+            out += (json.dumps({"ok": False, "error": f"line longer than {MAX_LINE} bytes"}) + "\n").encode()
+        querying[conn] = rest
+        try:
+            conn.setblocking(True)   # replies are small; don't juggle partial sends here
+            conn.settimeout(1.0)
+            conn.sendall(out)
+            conn.setblocking(False)
+        except OSError:
+            too_long = True
+        if too_long:
+            close_query(conn)
+
+    last_report = time.time()
+    try:
+        while True:
+            for k, _ in sel.select(timeout=1.0):
+                if k.data is None:
+                    try:
+                        conn, addr = lsock.accept()
+                    except BlockingIOError:
+                        continue
+                    conn.setblocking(False)
+                    pending[conn] = (addr, time.time())
+                    sel.register(conn, selectors.EVENT_READ, addr)
+                    continue
+                conn, addr = k.fileobj, k.data
+                if conn in querying:
+                    serve_query(conn)
+                    continue
+                try:
+                    head = conn.recv(PEEK_LIMIT, socket.MSG_PEEK)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    head = b""
+                nl = head.find(b"\n")
+                if nl < 0 and head and len(head) < PEEK_LIMIT:
+                    continue  # first line not complete yet
+                pending.pop(conn, None)
+                msg = _first_msg(head[:nl]) if nl >= 0 else None
+                if msg is not None and "query" in msg:
+                    querying[conn] = b""   # stays registered, answered here
+                    continue
+                sel.unregister(conn)
+                if not head:
+                    conn.close()
+                    continue
+                hand_off(conn, addr, _route_key(msg, addr))
+
+            now = time.time()
+            for conn, (addr, t0) in list(pending.items()):
+                if now - t0 > PEEK_TIMEOUT:
+                    sel.unregister(conn)
+                    del pending[conn]
+                    conn.close()
+            if now - last_report >= 5.0:
+                last_report = now
+                print(f"[tcp] avg30(all shards)={partials.combined_avg():.2f} routed={routed}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        lsock.close()
+        for conn in list(querying):
+            conn.close()
+        for c in ctrls:
+            c.close()
+        for q in pipes:
+            q.close()
+        for p in procs:
+            p.join(timeout=1.0)
+        partials.close(unlink=True)
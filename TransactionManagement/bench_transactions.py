@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+from transactions import LockingTransactionManager, TransactionManager
+
+# benchmarks for transactions.py
+#
+#   reads   read-heavy scaling over threads. every reader thread runs transactions of
+#           --reads-per-tx reads on random keys; --writers threads keep committing
+#           updates at the same time. mvcc (TransactionManager, lock-free snapshot
+#           reads) vs locking (LockingTransactionManager, one lock for everything)
+#   contention
+#           every thread increments one random key out of --hot-keys per transaction
+#           (read, write, commit; retried on a conflict abort, like two players racing
+#           in declare_winner_transactional). few hot keys = many conflicts; many = mostly
+#           disjoint transactions, which mvcc commits under different stripe locks
+#   soak    one thread runs --txs transactions (default 10M): most commit an update,
+#           --abort-rate abort, and --abandon-rate just walk away in BEGIN. prints
+#           RSS and table sizes every --report-every, which should level off: finished
+#           transactions leave the table, outcomes are a bounded cache, abandoned ones
+#           are reaped after --tx-timeout
+#   latest  stress check for get_resource(): --writers threads keep committing to ONE key
+#           while --readers threads call get_resource() on it, with a tiny GIL switch
+#           interval so threads interleave inside commit and the chain walk. gc trims
+#           that chain all the time; every read must still find a value. fails (exit 1)
+#           on a None read
+#
+# usage: python bench_transactions.py reads [--threads 1 2 4 8] [--writers 1] [--seconds 2]
+#        python bench_transactions.py contention [--threads 8] [--hot-keys 1 4 16 64 1024]
+#        python bench_transactions.py soak [--txs 10000000] [--report-every 1000000]
+#        python bench_transactions.py latest [--writers 2] [--readers 2] [--seconds 5]
+
+MANAGERS = {"locking": LockingTransactionManager, "mvcc": TransactionManager}
+
+
+def make_manager(kind, keys):
+    m = MANAGERS[kind]()
+    for i in range(keys):
+        m.set_resource_initial(f"k{i}", 0)
+    return m
+
+
+# runs the threads for `seconds`; each target(stop, rng, counts, slot) fills counts[slot]
+def run_threads(targets, seconds):
+    stop = threading.Event()
+    counts = [0] * len(targets)
+    threads = [threading.Thread(target=t, args=(stop, random.Random(i), counts, i))
+               for i, t in enumerate(targets)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def bench_reads(kind, threads, writers, keys, reads_per_tx, seconds):
+    m = make_manager(kind, keys)
+    names = [f"k{i}" for i in range(keys)]
+
+    def reader(stop, rng, counts, slot):
+        while not stop.is_set():
+            tx = m.begin()
+            for _ in range(reads_per_tx):
+                m.read(tx, rng.choice(names))
+            m.commit(tx)
+            counts[slot] += reads_per_tx
+
+    def writer(stop, rng, counts, slot):
+        while not stop.is_set():
+            tx = m.begin()
+            key = rng.choice(names)
+            m.write(tx, key, m.read(tx, key) + 1)
+            if m.commit(tx):
+                counts[slot] += 1
+
+    counts = run_threads([reader] * threads + [writer] * writers, seconds)
+    return {
+        "manager": kind,
+        "threads": threads,
+        "writers": writers,
+        "reads_per_sec": round(sum(counts[:threads]) / seconds),
+        "commits_per_sec": round(sum(counts[threads:]) / seconds),
+    }
+
+
+def bench_contention(kind, threads, hot_keys, seconds):
+    m = make_manager(kind, hot_keys)
+    names = [f"k{i}" for i in range(hot_keys)]
+    aborts = [0] * threads
+
+    def worker(stop, rng, counts, slot):
+        while not stop.is_set():
+            key = rng.choice(names)
+            while True:
+                tx = m.begin()
+                m.write(tx, key, m.read(tx, key) + 1)
+                if m.commit(tx):
+                    break
+                aborts[slot] += 1
+            counts[slot] += 1
+
+    counts = run_threads([worker] * threads, seconds)
+    total = sum(m.get_resource(k) for k in names)
+    # every counted commit must be in the data exactly once
+    assert total == sum(counts), (total, sum(counts))
+    return {
+        "manager": kind,
+        "threads": threads,
+        "hot_keys": hot_keys,
+        "commits_per_sec": round(sum(counts) / seconds),
+        "aborts_per_sec": round(sum(aborts) / seconds),
+    }
+
+
+def stress_latest(kind, writers, readers, seconds):
+    m = make_manager(kind, 1)
+    misses = [0] * readers
+
+    def writer(stop, rng, counts, slot):
+        while not stop.is_set():
+            tx = m.begin()
+            m.write(tx, "k0", slot)
+            m.commit(tx)
+            counts[slot] += 1
+
+    def reader(stop, rng, counts, slot):
+        while not stop.is_set():
+            if m.get_resource("k0") is None:
+                misses[slot - writers] += 1
+            counts[slot] += 1
+
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        counts = run_threads([writer] * writers + [reader] * readers, seconds)
+    finally:
+        sys.setswitchinterval(old)
+    return {
+        "manager": kind,
+        "commits": sum(counts[:writers]),
+        "reads": sum(counts[writers:]),
+        "none_reads": sum(misses),
+    }
+
+
+# resident memory in MB (current on linux, peak elsewhere)
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def soak(kind, txs, keys, abort_rate, abandon_rate, tx_timeout, report_every, seed):
+    if kind == "mvcc":
+        m = TransactionManager(tx_timeout=tx_timeout)
+        for i in range(keys):
+            m.set_resource_initial(f"k{i}", 0)
+    else:
+        m = make_manager(kind, keys)
+    names = [f"k{i}" for i in range(keys)]
+    rng = random.Random(seed)
+    rows = []
+    t0 = last = time.perf_counter()
+    for i in range(1, txs + 1):
+        tx = m.begin()
+        key = rng.choice(names)
+        value = m.read(tx, key)
+        r = rng.random()
+        if r >= abandon_rate:       # abandoned ones just stop here
+            m.write(tx, key, value + 1)
+            if r < abandon_rate + abort_rate:
+                m.abort(tx)
+            else:
+                m.commit(tx)
+        if i % report_every == 0:
+            now = time.perf_counter()
+            row = {
+                "txs": i,
+                "txs_per_sec": round(report_every / (now - last)),
+                "rss_mb": round(rss_mb(), 1),
+                "transactions": len(m._transactions),
+                "outcomes": len(getattr(m, "_outcomes", ())),
+                "versions": m.version_count() if hasattr(m, "version_count") else keys,
+                "reaped": getattr(m, "reaped", 0),
+            }
+            rows.append(row)
+            last = now
+            print(f"{kind:<8} {i:>10} txs  {row['txs_per_sec']:>6} tx/s  rss={row['rss_mb']:>7.1f} MB  "
+                  f"table={row['transactions']:<8} outcomes={row['outcomes']:<7} "
+                  f"versions={row['versions']:<6} reaped={row['reaped']}", flush=True)
+    print(f"{kind}: {txs} transactions in {time.perf_counter() - t0:.0f}s")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("reads", help="read-heavy scaling over threads")
+    r.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    r.add_argument("--writers", type=int, default=1)
+    r.add_argument("--keys", type=int, default=256)
+    r.add_argument("--reads-per-tx", type=int, default=16)
+    r.add_argument("--seconds", type=float, default=2.0)
+    c = sub.add_parser("contention", help="conflicting increments over a few or many hot keys")
+    c.add_argument("--threads", type=int, default=8)
+    c.add_argument("--hot-keys", type=int, nargs="+", default=[1, 4, 16, 64, 1024])
+    c.add_argument("--seconds", type=float, default=2.0)
+    s = sub.add_parser("soak", help="memory over millions of transactions")
+    s.add_argument("--txs", type=int, default=10_000_000)
+    s.add_argument("--report-every", type=int, default=1_000_000)
+    s.add_argument("--keys", type=int, default=1000)
+    s.add_argument("--abort-rate", type=float, default=0.05)
+    s.add_argument("--abandon-rate", type=float, default=0.01)
+    s.add_argument("--tx-timeout", type=float, default=1.0, help="seconds before BEGIN is reaped (mvcc)")
+    s.add_argument("--seed", type=int, default=1)
+    s.add_argument("--manager", choices=list(MANAGERS), default="mvcc",
+                   help="locking has no cleanup; run it with fewer --txs to see it grow")
+    s.add_argument("--json", action="store_true", help="also print the rows as json")
+    g = sub.add_parser("latest", help="get_resource() under concurrent commits and gc")
+    g.add_argument("--writers", type=int, default=2)
+    g.add_argument("--readers", type=int, default=2)
+    g.add_argument("--seconds", type=float, default=5.0)
+    for p in (r, c, g):
+        p.add_argument("--manager", nargs="+", choices=list(MANAGERS), default=list(MANAGERS))
+        p.add_argument("--json", action="store_true", help="also print the rows as json")
+    args = ap.parse_args()
+
+    rows = []
+    if args.cmd == "reads":
+        for threads in args.threads:
+            for kind in args.manager:
+                row = bench_reads(kind, threads, args.writers, args.keys, args.reads_per_tx, args.seconds)
+                rows.append(row)
+                print(f"{kind:<8} threads={threads:<3} writers={args.writers:<2} "
+                      f"{row['reads_per_sec']:>9} reads/s  {row['commits_per_sec']:>7} write commits/s")
+    elif args.cmd == "contention":
+        for hot in args.hot_keys:
+            for kind in args.manager:
+                row = bench_contention(kind, args.threads, hot, args.seconds)
+                rows.append(row)
+                print(f"{kind:<8} threads={args.threads:<3} hot_keys={hot:<5} "
+                      f"{row['commits_per_sec']:>7} commits/s  {row['aborts_per_sec']:>7} aborts/s")
+    elif args.cmd == "soak":
+        rows = soak(args.manager, args.txs, args.keys, args.abort_rate, args.abandon_rate,
+                    args.tx_timeout, args.report_every, args.seed)
+    elif args.cmd == "latest":
+        for kind in args.manager:
+            row = stress_latest(kind, args.writers, args.readers, args.seconds)
+            rows.append(row)
+            print(f"{kind:<8} writers={args.writers:<2} readers={args.readers:<2} {row['commits']:>8} commits "
+                  f"{row['reads']:>9} reads  {row['none_reads']} None reads")
+    if args.json:
+        print(json.dumps(rows))
+    if any(row.get("none_reads") for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
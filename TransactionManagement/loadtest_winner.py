@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+
+# load test for winner_coordinator.py: requests/sec and latency percentiles
+#
+# persistent (default): --connections stay open and each keeps --pipeline requests in
+# flight. every request is one DECLARE_WINNER line for --batch matches picked from
+# --matches, e.g. "DECLARE_WINNER m17:p3 m4:p9"
+# --oneshot: a new connection per request, the way the original server has to be used
+#
+# --spawn async|oneshot starts winner_coordinator.py itself (quiet, on --port) and
+# stops it at the end
+#
+# usage: python loadtest_winner.py --spawn async [--connections 16] [--pipeline 8] [--batch 1]
+#        python loadtest_winner.py --spawn oneshot --oneshot [--connections 16]
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(len(sorted_vals) * p / 100.0)) - 1)
+    return sorted_vals[max(0, i)]
+
+
+def make_request(rng, matches, batch):
+    picks = rng.sample(range(matches), batch)
+    return "DECLARE_WINNER " + " ".join(f"m{m}:p{rng.randrange(1000)}" for m in picks) + "\n"
+
+
+async def persistent_client(host, port, count, pipeline, matches, batch, rng, latencies, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    sent_at = []    # send times of requests still waiting, oldest first (replies come in order)
+    sent = done = 0
+    while done < count:
+        # top up to `pipeline` outstanding requests, written together
+        lines = []
+        while sent < count and sent - done < pipeline:
+            lines.append(make_request(rng, matches, batch))
+            sent += 1
+        if lines:
+            now = time.perf_counter()
+            sent_at.extend([now] * len(lines))
+            writer.write("".join(lines).encode())
+        reply = await reader.readline()
+        if not reply:
+            raise ConnectionError("server closed the connection")
+        latencies.append(time.perf_counter() - sent_at.pop(0))
+        for word in reply.split():
+            results[word.decode()] = results.get(word.decode(), 0) + 1
+        done += 1
+    writer.close()
+
+
+async def oneshot_client(host, port, count, matches, batch, rng, latencies, results):
+    for _ in range(count):
+        t0 = time.perf_counter()
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(make_request(rng, matches, batch).encode())
+        reply = await reader.readline()
+        latencies.append(time.perf_counter() - t0)
+        for word in reply.split():
+            results[word.decode()] = results.get(word.decode(), 0) + 1
+        writer.close()
+
+
+async def run(args):
+    latencies, results = [], {}
+    per_conn = args.requests // args.connections
+    clients = []
+    for i in range(args.connections):
+        rng = random.Random(args.seed + i)
+        if args.oneshot:
+            clients.append(oneshot_client(args.host, args.port, per_conn, args.matches, args.batch,
+                                          rng, latencies, results))
+        else:
+            clients.append(persistent_client(args.host, args.port, per_conn, args.pipeline, args.matches,
+                                             args.batch, rng, latencies, results))
+    t0 = time.perf_counter()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "mode": "oneshot" if args.oneshot else "persistent",
+        "connections": args.connections,
+        "pipeline": 1 if args.oneshot else args.pipeline,
+        "batch": args.batch,
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / elapsed),
+        "declarations_per_sec": round(len(latencies) * args.batch / elapsed),
+        "p50_ms": round(percentile(latencies, 50) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1e3, 3),
+        "results": results,
+    }
+
+
+def spawn_server(mode, host, port):
+    proc = subprocess.Popen([sys.executable, "winner_coordinator.py", "--mode", mode, "--quiet",
+                             "--host", host, "--port", str(port)], stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("winner_coordinator.py did not start")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5001)
+    ap.add_argument("--connections", type=int, default=16)
+    ap.add_argument("--pipeline", type=int, default=8, help="requests in flight per connection")
+    ap.add_argument("--requests", type=int, default=50000)
+    ap.add_argument("--batch", type=int, default=1, help="matches per DECLARE_WINNER")
+    ap.add_argument("--matches", type=int, default=100000)
+    ap.add_argument("--oneshot", action="store_true", help="new connection per request")
+    ap.add_argument("--spawn", choices=["async", "oneshot"], help="start the server too")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="also print the result as json")
+    args = ap.parse_args()
+
+    proc = spawn_server(args.spawn, args.host, args.port) if args.spawn else None
+    try:
+        r = asyncio.run(run(args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    print(f"{r['mode']:<10} connections={r['connections']:<4} pipeline={r['pipeline']:<4} batch={r['batch']:<3} "
+          f"{r['requests_per_sec']:>7} req/s  {r['declarations_per_sec']:>7} declarations/s  "
+          f"p50={r['p50_ms']:.2f} ms  p99={r['p99_ms']:.2f} ms  {r['results']}")
+    if args.json:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import threading
 import time
 import uuid
+from bisect import bisect_right
+from collections import OrderedDict
 from enum import Enum, auto
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
 
 #transaction = 3 states
 # Begin, Commit, Abort
@@ -23,8 +25,24 @@ class Transaction:
         #"winner": {"player_id": "player_A", "timestamp": 123456.78}
     #}
     version_snapshot: Dict[str, int] = field(default_factory= dict)
-    
-class TransactionManager:
+    #commit counter when the transaction started, reads see everything committed up to it
+    start_ts: int = 0
+    #time.monotonic() at begin, for reaping abandoned transactions
+    started: float = 0.0
+
+#one committed value of a resource (TransactionManager keeps a list of these per resource)
+#a tuple, not a dataclass: one is built per written resource on every commit
+class Version(NamedTuple):
+    value: Any
+    version: int        # 0 for the initial value, +1 on every commit that writes it
+    commit_ts: int      # manager commit counter when it became visible
+
+def _commit_ts_of(v: Version) -> int:
+    return v.commit_ts
+
+#the original manager: latest value only, one lock around everything
+#kept so the benchmarks have something to compare against
+class LockingTransactionManager:
     def __init__(self):
         #protect all shared resources with a lock
         self._lock = threading.Lock()
@@ -182,6 +200,318 @@ class TransactionManager:
                 tx.status = TransactionStatus.ABORTED
                 tx.writes.clear()
                 tx.version_snapshot.clear()
+
+
+#multi-version store: every resource keeps a short chain of committed versions
+#
+#a transaction remembers the commit counter at begin() (start_ts) and reads the newest
+#version committed at or before it, so all its reads come from one snapshot. reads and
+#get_resource() never take the lock: a commit appends its versions (or swaps in a
+#trimmed copy of the chain) and only then bumps the commit counter
+#
+#commit validates like before (every version the transaction saw must still be the
+#latest, otherwise abort). there is no global commit lock: resources hash onto `stripes`
+#locks and a commit takes only the stripes of the resources it read or wrote, in index
+#order (so two commits can never wait on each other in a cycle). transactions on
+#unrelated resources validate and apply in parallel
+#
+#parallel commits finish out of order, so the commit counter readers snapshot from only
+#moves past ts once every commit numbered up to ts has installed its versions
+#
+#versions that no active transaction can see anymore are dropped when the resource is
+#written again, or by collect_versions()
+#
+#finished transactions leave the table right away; only their outcome is kept, in a
+#cache of the last `outcome_cache_size` (status() answers from it, and a repeated
+#commit() still returns False). a transaction left in BEGIN for longer than
+#`tx_timeout` seconds is aborted by the reaper, which runs every `reap_every` begins
+#(or call reap_expired()), so a client that disappears cannot pin memory or old versions
+class TransactionManager:
+    def __init__(self, stripes: int = 64, tx_timeout: float = 30.0,
+                 outcome_cache_size: int = 100_000, reap_every: int = 1024):
+        #short bookkeeping only (transaction table, commit numbers), never held
+        #while validating or applying, and reads do not take it
+        self._lock = threading.Lock()
+
+        #per-resource locks, resource_id hashes to one of these
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+        # resource_id -> [Version, ...] oldest first
+        self._chains: Dict[str, List[Version]] = {}
+
+        #running transcations by id (finished ones are removed)
+        self._transactions: Dict[str, Transaction] = {}
+
+        #transaction id -> COMMITTED/ABORTED for recently finished ones, oldest first
+        self._outcomes: "OrderedDict[str, TransactionStatus]" = OrderedDict()
+        self.outcome_cache_size = outcome_cache_size
+
+        #active transaction id -> start_ts, in begin order, so the first entry is both
+        #the oldest snapshot (what gc may drop) and the first one the reaper looks at
+        self._active: Dict[str, int] = {}
+        self.tx_timeout = tx_timeout
+        self._reap_every = reap_every
+        self._begins = 0
+        self.reaped = 0
+        self._commit_ts = 0         # newest commit readers may see
+        self._next_ts = 1           # number for the next writing commit
+        self._installed = set()     # commit numbers done but not yet visible (a lower one is still running)
+        self.versions_collected = 0
+
+    def begin(self) -> str:
+        transaction_id = f"tx-{uuid.uuid4().hex}"
+
+        #under the lock so gc cannot drop the snapshot before it is registered
+        with self._lock:
+            new_transaction = Transaction(transaction_id=transaction_id, start_ts=self._commit_ts,
+                                          started=time.monotonic())
+            self._transactions[transaction_id] = new_transaction
+            self._active[transaction_id] = new_transaction.start_ts
+            self._begins += 1
+            if self._begins % self._reap_every == 0:
+                self._reap(new_transaction.started)
+
+        return transaction_id
+
+    #abort every transaction that has been in BEGIN for longer than tx_timeout
+    def reap_expired(self) -> int:
+        with self._lock:
+            return self._reap(time.monotonic())
+
+    #self._lock held. _active is in begin order, so stop at the first young one
+    def _reap(self, now: float) -> int:
+        deadline = now - self.tx_timeout
+        reaped = 0
+        while self._active:
+            transaction_id = next(iter(self._active))
+            tx = self._transactions[transaction_id]
+            if tx.started > deadline:
+                break
+            del self._active[transaction_id]
+            self._finish(tx, TransactionStatus.ABORTED)
+            reaped += 1
+        self.reaped += reaped
+        return reaped
+
+    #BEGIN, COMMITTED or ABORTED; None if unknown (or finished too long ago)
+    def status(self, transaction_id: str) -> Optional[TransactionStatus]:
+        tx = self._transactions.get(transaction_id)
+        if tx is not None:
+            return tx.status
+        return self._outcomes.get(transaction_id)
+
+    def _stripe(self, resource_id: str) -> int:
+        return hash(resource_id) % len(self._stripes)
+
+    def set_resource_initial(self, resource_id: str, value: Any) -> None:
+        with self._stripes[self._stripe(resource_id)]:
+            #commit_ts 0: visible to every snapshot
+            self._chains[resource_id] = [Version(value, 0, 0)]
+
+    #newest version of a resource visible at ts, or None
+    def _visible(self, resource_id: str, ts: int) -> Optional[Version]:
+        chain = self._chains.get(resource_id)
+        if chain is None:
+            return None
+        for v in reversed(chain):
+            if v.commit_ts <= ts:
+                return v
+        return None
+
+    #latest committed value. it is not registered in the active table, so a commit may
+    #trim the versions visible at the ts it read while it walks the chain. gc always
+    #keeps one version that is already published, so a miss on a chain whose oldest
+    #version is published means that happened: look again at the newer commit_ts
+    def get_resource(self, resource_id: str) -> Any:
+        while True:
+            v = self._visible(resource_id, self._commit_ts)
+            if v is not None:
+                return v.value
+            chain = self._chains.get(resource_id)
+            if chain is None or chain[0].commit_ts > self._commit_ts:
+                return None
+
+    def _get_active(self, transaction_id: str) -> Transaction:
+        tx = self._transactions.get(transaction_id)
+        if tx is None:
+            if transaction_id in self._outcomes:
+                raise RuntimeError(f"Transaction {transaction_id} is not active.")
+            raise RuntimeError(f"Transaction {transaction_id} does not exist.")
+        if tx.status != TransactionStatus.BEGIN:
+            raise RuntimeError(f"Transaction {transaction_id} is not active.")
+        return tx
+
+    #version (and value) of a resource in the transaction's snapshot, recorded for commit
+    def _snapshot(self, tx: Transaction, resource_id: str) -> Any:
+        v = self._visible(resource_id, tx.start_ts)
+        if resource_id not in tx.version_snapshot:
+            tx.version_snapshot[resource_id] = 0 if v is None else v.version
+        return None if v is None else v.value
+
+    def read(self, transaction_id: str, resource_id: str) -> Any:
+        tx = self._get_active(transaction_id)
+
+        #the transaction's own writes win
+        if resource_id in tx.writes:
+            return tx.writes[resource_id]
+
+        return self._snapshot(tx, resource_id)
+
+    def write(self, transaction_id: str, resource_id: str, value: Any) -> None:
+        tx = self._get_active(transaction_id)
+        self._snapshot(tx, resource_id)
+        tx.writes[resource_id] = value
+
+    def commit(self, transaction_id: str) -> bool:
+        tx = self._transactions.get(transaction_id)
+        if tx is None:
+            #already finished: same answer as before the table was cleaned up
+            if transaction_id in self._outcomes:
+                return False
+            raise RuntimeError(f"transaction {transaction_id} does not exist.")
+
+        #leaving the active table marks the transaction as committing: a second
+        #commit(), an abort() or the reaper stops here. claimed before anything looks at
+        #its read and write sets, so nobody clears them under us. it reads nothing from
+        #now on, so gc no longer has to keep its snapshot
+        with self._lock:
+            if self._active.pop(transaction_id, None) is None:
+                return False
+        if not tx.writes:
+            return self._commit_read_only(tx)
+
+        #every resource the transaction depends on, locked in a fixed order
+        #(written resources are always in version_snapshot too)
+        n = len(self._stripes)
+        stripes = sorted({hash(r) % n for r in tx.version_snapshot})
+        for i in stripes:
+            self._stripes[i].acquire()
+        try:
+            #the commit number is taken while holding the stripes
+            with self._lock:
+                ts = self._next_ts
+                self._next_ts += 1
+                oldest = self._oldest_snapshot()
+
+            #conflict detection, same rule as before
+            for resource_id, snap_version in tx.version_snapshot.items():
+                chain = self._chains.get(resource_id)
+                current_version = chain[-1].version if chain else 0
+                if current_version != snap_version:
+                    with self._lock:
+                        self._publish(ts)
+                        self._finish(tx, TransactionStatus.ABORTED)
+                    return False
+
+            collected = 0
+            for resource_id, new_value in tx.writes.items():
+                chain = self._chains.get(resource_id)
+                if chain is None:
+                    self._chains[resource_id] = [Version(new_value, 1, ts)]
+                    continue
+                new = Version(new_value, chain[-1].version + 1, ts)
+                keep = self._dead_versions(chain, oldest)
+                if keep and keep * 2 >= len(chain):
+                    #a reader may be walking the old list, so trimming makes a new one.
+                    #waiting until half of it is dead keeps the copying cheap
+                    self._chains[resource_id] = chain[keep:] + [new]
+                    collected += keep
+                else:
+                    #appending in place is safe: a reader walking backwards started
+                    #below it, and the new version is not visible to it anyway
+                    chain.append(new)
+
+            with self._lock:
+                self._publish(ts)
+                self.versions_collected += collected
+                self._finish(tx, TransactionStatus.COMMITTED)
+            return True
+        finally:
+            for i in reversed(stripes):
+                self._stripes[i].release()
+
+    #a transaction that wrote nothing installs nothing, so it needs no stripes and no
+    #commit number. same rule as a writer: it commits if every version it read is still
+    #the newest one. checking them one at a time without locks is enough: version
+    #numbers only grow, so each one was still the newest when the first check ran,
+    #and the transaction serializes at that point
+    def _commit_read_only(self, tx: Transaction) -> bool:
+        ok = True
+        for resource_id, snap_version in tx.version_snapshot.items():
+            chain = self._chains.get(resource_id)
+            if (chain[-1].version if chain else 0) != snap_version:
+                ok = False
+                break
+        with self._lock:
+            self._finish(tx, TransactionStatus.COMMITTED if ok else TransactionStatus.ABORTED)
+        return ok
+
+    #self._lock held. snapshots taken from now on include commit ts, once every
+    #earlier-numbered commit has installed its versions too (an aborted number counts as done)
+    def _publish(self, ts: Optional[int]) -> None:
+        if ts is None:
+            return
+        if ts == self._commit_ts + 1 and not self._installed:
+            self._commit_ts = ts     # the usual case: nothing else in flight
+            return
+        self._installed.add(ts)
+        while self._commit_ts + 1 in self._installed:
+            self._commit_ts += 1
+            self._installed.discard(self._commit_ts)
+
+    def abort(self, transaction_id: str) -> None:
+        with self._lock:
+            tx = self._transactions.get(transaction_id)
+            #not in the active table: finished, or inside commit()
+            if tx is not None and self._active.pop(transaction_id, None) is not None:
+                self._finish(tx, TransactionStatus.ABORTED)
+
+    #self._lock held, transaction already out of the active table
+    def _finish(self, tx: Transaction, status: TransactionStatus) -> None:
+        tx.status = status
+        if status == TransactionStatus.ABORTED:
+            tx.writes.clear()
+            tx.version_snapshot.clear()
+        #keep just the outcome, and only for the most recent ones
+        del self._transactions[tx.transaction_id]
+        self._outcomes[tx.transaction_id] = status
+        if len(self._outcomes) > self.outcome_cache_size:
+            self._outcomes.popitem(last=False)
+
+    #self._lock held. start_ts of the first active transaction (they are in begin order),
+    #or the published commit counter when nothing is running
+    def _oldest_snapshot(self) -> int:
+        for start_ts in self._active.values():
+            return start_ts
+        return self._commit_ts
+
+    #how many versions at the front of a chain are dead: everything before the newest
+    #version the oldest snapshot can see (chains are in commit_ts order)
+    @staticmethod
+    def _dead_versions(chain: List[Version], oldest: int) -> int:
+        if len(chain) < 2 or chain[1].commit_ts > oldest:
+            return 0
+        return bisect_right(chain, oldest, key=_commit_ts_of) - 1
+
+    #drop dead versions of every resource, not just the ones being written
+    def collect_versions(self) -> int:
+        with self._lock:
+            oldest = self._oldest_snapshot()
+        collected = 0
+        for resource_id in list(self._chains):
+            with self._stripes[self._stripe(resource_id)]:
+                chain = self._chains[resource_id]
+                keep = self._dead_versions(chain, oldest)
+                if keep:
+                    self._chains[resource_id] = chain[keep:]
+                    collected += keep
+        with self._lock:
+            self.versions_collected += collected
+        return collected
+
+    #total versions stored, for benchmarks
+    def version_count(self) -> int:
+        return sum(len(chain) for chain in list(self._chains.values()))
             
 class GameState:
     WINNER_KEY = "winner"
@@ -192,17 +522,25 @@ class GameState:
         #make sure the winner resource exist and starts as none
         self.tx_manager.set_resource_initial(self.WINNER_KEY, None)
         
+    #resource holding the winner of one match, or the single game winner
+    def winner_key(self, match_id: Optional[str] = None) -> str:
+        if match_id is None:
+            return self.WINNER_KEY
+        return f"{self.WINNER_KEY}:{match_id}"
+
     #return offical winner
-    def get_committed_winner(self) -> Any:
-        return self.tx_manager.get_resource(self.WINNER_KEY)
+    def get_committed_winner(self, match_id: Optional[str] = None) -> Any:
+        return self.tx_manager.get_resource(self.winner_key(match_id))
     
     #declare player winner using tranaction
-    def declare_winner_transactional(self, player_id: str)-> bool:
+    #match_id: many matches can run at once, each gets its own winner (starts as none)
+    def declare_winner_transactional(self, player_id: str, match_id: Optional[str] = None)-> bool:
+        key = self.winner_key(match_id)
         transaction_id = self.tx_manager.begin()
         
         try:
             #read winner in transaction
-            current_winner = self.tx_manager.read(transaction_id, self.WINNER_KEY)
+            current_winner = self.tx_manager.read(transaction_id, key)
             
             #if someone has already won, abort
             if current_winner is not None:
@@ -215,7 +553,7 @@ class GameState:
                 "timestamp": time.time()
             }
             
-            self.tx_manager.write(transaction_id, self.WINNER_KEY, winner_record)
+            self.tx_manager.write(transaction_id, key, winner_record)
             
             #commit
             committed = self.tx_manager.commit(transaction_id)
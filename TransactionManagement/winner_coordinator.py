@@ -1,49 +1,133 @@
+import argparse
+import asyncio
 import socket
 from transactions import GameState
 
 HOST = "127.0.0.1"   # localhost for now
 PORT = 5001          # pick any free port
+MAX_LINE = 65536     # longest command line a connection may buffer
+
+# protocol: one command per line, one reply line per command, in order.
+# a connection stays open for as many commands as the client wants, and a client may
+# send the next commands before the replies come back (pipelining)
+#
+#   DECLARE_WINNER player_A                 -> WON | LOST   (the single game winner)
+#   DECLARE_WINNER m1:player_A m2:player_B  -> WON LOST     (one word per match, one round trip)
+#
+# a command with a bad declaration is rejected as a whole, nothing in it is committed.
+# a line longer than MAX_LINE gets "ERROR Line too long" and the connection is closed
+#
+# --mode oneshot is the original server: one connection at a time, one command each
+
+
+# the reply line for one command
+def handle_command(message: str, game_state: GameState) -> str:
+    parts = message.split()
+    if len(parts) >= 2 and parts[0] == "DECLARE_WINNER":
+        # check every declaration before running any transaction
+        declarations = []
+        for arg in parts[1:]:
+            match_id, sep, player_id = arg.rpartition(":")
+            if sep and not (match_id and player_id):
+                return "ERROR Bad declaration " + arg
+            declarations.append((match_id or None, player_id))
+        results = []
+        for match_id, player_id in declarations:
+            # use your transactional winner logic
+            success = game_state.declare_winner_transactional(player_id, match_id)
+            results.append("WON" if success else "LOST")
+        return " ".join(results)
+    return "ERROR Unknown command"
+
+
+async def handle_connection(reader, writer, game_state: GameState, quiet: bool):
+    addr = writer.get_extra_info("peername")
+    if not quiet:
+        print(f"[COORDINATOR] Connection from {addr}")
+    buf = b""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            # answer every complete line of this read with one write
+            *lines, buf = (buf + data).split(b"\n")
+            replies = []
+            for line in lines:
+                message = line.decode().strip()
+                if not message:
+                    continue
+                if not quiet:
+                    print(f"[COORDINATOR] Received: {message}")
+                replies.append(handle_command(message, game_state) + "\n")
+            # no newline in sight: stop buffering instead of growing without bound
+            if len(buf) > MAX_LINE:
+                replies.append("ERROR Line too long\n")
+            if replies:
+                writer.write("".join(replies).encode("utf-8"))
+                await writer.drain()
+            if len(buf) > MAX_LINE:
+                break
+    except (ConnectionError, UnicodeDecodeError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(game_state: GameState, host: str, port: int, quiet: bool):
+    # the event loop runs every transaction, so GameState needs no extra locking here
+    server = await asyncio.start_server(
+        lambda r, w: handle_connection(r, w, game_state, quiet), host, port, backlog=1024)
+    print(f"[COORDINATOR] Starting winner service on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["async", "oneshot"], default="async")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--quiet", action="store_true", help="no line per connection/command")
+    args = ap.parse_args()
+
     game_state = GameState()
-    print(f"[COORDINATOR] Starting winner service on {HOST}:{PORT}")
+    if args.mode == "async":
+        try:
+            asyncio.run(serve(game_state, args.host, args.port, args.quiet))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    print(f"[COORDINATOR] Starting winner service on {args.host}:{args.port}")
 
     # basic TCP server skeleton
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_sock:
         server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_sock.bind((HOST, PORT))
+        server_sock.bind((args.host, args.port))
         server_sock.listen()
 
         print("[COORDINATOR] Waiting for connections...")
 
         while True:
             conn, addr = server_sock.accept()
-            print(f"[COORDINATOR] Connection from {addr}")
-            handle_client(conn, game_state)
+            if not args.quiet:
+                print(f"[COORDINATOR] Connection from {addr}")
+            handle_client(conn, game_state, args.quiet)
 
 
-def handle_client(conn, game_state: GameState):
+def handle_client(conn, game_state: GameState, quiet: bool = False):
     with conn:
         data = conn.recv(1024)
         if not data:
             return
 
         message = data.decode().strip()
-        print(f"[COORDINATOR] Received: {message}")
-
-        parts = message.split()
-        if len(parts) == 2 and parts[0] == "DECLARE_WINNER":
-            player_id = parts[1]
-            # use your transactional winner logic
-            success = game_state.declare_winner_transactional(player_id)
-            if success:
-                response = "WON\n"
-            else:
-                response = "LOST\n"
-        else:
-            response = "ERROR Unknown command\n"
+        if not quiet:
+            print(f"[COORDINATOR] Received: {message}")
 
+        response = handle_command(message, game_state) + "\n"
         conn.sendall(response.encode("utf-8"))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
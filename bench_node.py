@@ -0,0 +1,567 @@
+"""
+Benchmarks for os_concurrency_node.py
+
+Each subcommand builds the node's pieces directly (no producers, no sleeps), preloads
+a seeded message mix and times how fast the workers get through it.
+
+Usage examples:
+    python bench_node.py state --messages 200000 --workers 1 2 4 8
+    python bench_node.py churn --players 20000 --ratios 0.05 0.25 0.45
+    python bench_node.py batch --messages 200000 --batch 64 256 1024
+    python bench_node.py lifecycle --nodes 100 --idle 5
+    python bench_node.py outbox --acks 100000 --batch 1 16 64 256 --proto tcp udp
+    python bench_node.py alloc --messages 200000
+    python bench_node.py capacity --max-players 64 --queue 0 16 64
+    python bench_node.py sweep --producers 1 2 4 --queue 64 1024 --locks global striped --csv out.csv
+    python bench_node.py trace --out trace.jsonl --messages 500000
+        (then: python os_concurrency_node.py --replay trace.jsonl --workers 4 --batch 256)
+"""
+
+from __future__ import annotations
+import argparse
+import csv
+import gc
+import itertools
+import json
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List
+
+from os_concurrency_node import (Ack, CapacityManager, Kind, Msg, NetworkOutbox, OrderedPlayers, OutboxWorker, SharedState, LoggerWorker,
+                                 make_simulation_worker, make_state, np, record_trace, run_bench, send_stop, shutdown_node, STOP)
+
+
+def make_messages(n: int, players: int, seed: int, weights=(0.1, 0.8, 0.1)) -> List[Msg]:
+    rng = random.Random(seed)
+    ids = [f"P{i:05d}" for i in range(players)]
+    kinds = rng.choices([Kind.JOIN, Kind.UPDATE, Kind.LEAVE], weights=weights, k=n)
+    out = []
+    for kind in kinds:
+        delta = rng.randint(-7, 5) if kind is Kind.UPDATE else 0
+        out.append(Msg(kind, rng.choice(ids), ts=0.0, delta=delta))
+    return out
+
+
+def run_workers(msgs: List[Msg], workers: int, stripes: int, max_players: int, state=None,
+                batch: int = 0, slots=None, out_q=None) -> float:
+    # returns msgs/sec for one preloaded run
+    in_q: queue.Queue = queue.Queue()
+    if out_q is None:
+        out_q = queue.Queue()
+    for m in msgs:
+        in_q.put_nowait(m)
+    if state is None:
+        state = make_state(stripes)
+    if slots is None:
+        slots = CapacityManager(max_players)
+    shutdown = threading.Event()
+    low = threading.Event()
+    sims = [make_simulation_worker(f"sim-{i}", batch=batch, in_q=in_q, out_q=out_q, state=state, slots=slots,
+                                   low_health_event=low, shutdown=shutdown) for i in range(workers)]
+    t0 = time.perf_counter()
+    for t in sims:
+        t.start()
+    in_q.join()
+    dt = time.perf_counter() - t0
+    shutdown.set()
+    send_stop(in_q, len(sims))
+    for t in sims:
+        t.join()
+    return len(msgs) / dt
+
+
+def bench_state(args):
+    msgs = make_messages(args.messages, args.players, args.seed)
+    run_workers(msgs[:10_000], 1, 0, args.players)  # warm-up so the first row is not penalized
+    rows = []
+    for design, stripes in (("single-lock", 0), ("striped", args.stripes)):
+        for w in args.workers:
+            rate = run_workers(msgs, w, stripes, args.players)
+            rows.append({"design": design, "stripes": stripes, "workers": w, "msgs_per_sec": round(rate)})
+            print(f"{design:>12} stripes={stripes:<3} workers={w:<3} {rate:>10.0f} msgs/s")
+    if args.json:
+        print(json.dumps(rows))
+
+
+def bench_churn(args):
+    # every player joins first, then a join/leave-heavy mix churns the full roster.
+    # list.remove scans the roster on every leave; OrderedPlayers deletes in O(1)
+    rows = []
+    joins = [Msg(Kind.JOIN, f"P{i:05d}", ts=0.0) for i in range(args.players)]
+    for ratio in args.ratios:
+        mix = make_messages(args.messages, args.players, args.seed,
+                            weights=(ratio, max(0.0, 1 - 2 * ratio), ratio))
+        for name, order in (("list", list), ("ordered-set", OrderedPlayers)):
+            state = SharedState(lock=threading.Lock(), player_order=order())
+            rate = run_workers(joins + mix, 1, 0, args.players, state=state)
+            ok = len(state.player_health) == len(state.player_order)
+            rows.append({"order": name, "join_leave_ratio": ratio, "msgs_per_sec": round(rate), "invariant_ok": ok})
+            print(f"ratio={ratio:<5} {name:>12} {rate:>10.0f} msgs/s  active={len(state.player_health)} invariant_ok={ok}")
+    if args.json:
+        print(json.dumps(rows))
+
+
+def bench_batch(args):
+    # update-heavy traffic over a small roster, so batches have many updates per player.
+    # one warm-up run, then --repeat rounds that each run every config once (so a noisy
+    # stretch hits all of them); the best run of each config is reported
+    msgs = make_messages(args.messages, args.players, args.seed, weights=(0.02, 0.96, 0.02))
+    rows = []
+    configs = [("per-message", 0, False)] + [(f"batch={b}", b, False) for b in args.batch]
+    if np is not None:
+        configs += [(f"batch={b}+numpy", b, True) for b in args.batch]
+    else:
+        print("(numpy not installed, skipping the vectorized rows)")
+    run_workers(msgs[:20_000], 1, 0, args.players)
+    best = {name: 0.0 for name, _, _ in configs}
+    for _ in range(args.repeat):
+        for name, batch, use_np in configs:
+            state = make_state(0, numpy_health=use_np)
+            best[name] = max(best[name], run_workers(msgs, 1, 0, args.players, state=state, batch=batch))
+    base = best["per-message"]
+    for name, _, _ in configs:
+        rate = best[name]
+        rows.append({"mode": name, "msgs_per_sec": round(rate), "vs_per_message": round(rate / base, 2)})
+        print(f"{name:>18} {rate:>10.0f} msgs/s  x{rate / base:.2f}")
+    if args.json:
+        print(json.dumps(rows))
+
+
+class _PollingWorker(threading.Thread):
+    # the previous worker loop, kept here as the "before" baseline: wake every 0.2 s
+    def __init__(self, q: queue.Queue, shutdown: threading.Event):
+        super().__init__(daemon=True)
+        self.q = q
+        self.shutdown = shutdown
+
+    def run(self):
+        while not self.shutdown.is_set():
+            try:
+                self.q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.q.task_done()
+
+
+def _idle_nodes_polling(n: int):
+    shutdown = threading.Event()
+    qs = [(queue.Queue(), queue.Queue()) for _ in range(n)]
+    threads = [w for in_q, out_q in qs for w in (_PollingWorker(in_q, shutdown), _PollingWorker(out_q, shutdown))]
+    for t in threads:
+        t.start()
+
+    def stop():
+        shutdown.set()
+        # the old main(): poll the queues every 50 ms, then join
+        while any(not a.empty() or not b.empty() for a, b in qs):
+            time.sleep(0.05)
+        for t in threads:
+            t.join()
+    return stop
+
+
+def _idle_nodes_sentinel(n: int):
+    nodes = []
+    for i in range(n):
+        shutdown, low = threading.Event(), threading.Event()
+        in_q, out_q = queue.Queue(), queue.Queue()
+        state = make_state(0)
+        slots = CapacityManager(8)
+        sim = make_simulation_worker(f"sim-{i}", in_q=in_q, out_q=out_q, state=state, slots=slots,
+                                     low_health_event=low, shutdown=shutdown)
+        outbox = OutboxWorker(f"outbox-{i}", out_q, shutdown)
+        logger = LoggerWorker(f"logger-{i}", state, slots, in_q, out_q, low, shutdown, interval=3600)
+        for t in (sim, outbox, logger):
+            t.start()
+        nodes.append((shutdown, sim, outbox, logger, in_q, out_q))
+
+    def stop():
+        for shutdown, sim, outbox, logger, in_q, out_q in nodes:
+            shutdown_node(shutdown, [], [sim], outbox, logger, in_q, out_q)
+    return stop
+
+
+def bench_lifecycle(args):
+    # idle CPU of N nodes' consumer threads and the time it takes to stop them all
+    rows = []
+    for name, start in (("polling (before)", _idle_nodes_polling), ("sentinel (after)", _idle_nodes_sentinel)):
+        stop = start(args.nodes)
+        time.sleep(0.5)  # let startup settle
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        time.sleep(args.idle)
+        cpu = time.process_time() - cpu0
+        idle_pct = cpu / (time.perf_counter() - wall0) * 100
+        t0 = time.perf_counter()
+        stop()
+        stop_ms = (time.perf_counter() - t0) * 1e3
+        rows.append({"mode": name, "nodes": args.nodes, "idle_cpu_pct": round(idle_pct, 2), "shutdown_ms": round(stop_ms, 1)})
+        print(f"{name:>18} nodes={args.nodes:<4} idle cpu={idle_pct:6.2f}%  shutdown={stop_ms:8.1f} ms")
+    if args.json:
+        print(json.dumps(rows))
+
+
+def _sink(proto: str):
+    # local receiver that counts ack lines; returns (address, counter dict, stop)
+    count = {"lines": 0}
+    if proto == "udp":
+        srv = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        srv.bind(("127.0.0.1", 0))
+    else:
+        srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv.bind(("127.0.0.1", 0))
+        srv.listen()
+    addr = srv.getsockname()
+
+    def serve():
+        try:
+            if proto == "udp":
+                while True:
+                    data = srv.recv(65536)
+                    if data == b"bye":
+                        return
+                    count["lines"] += data.count(b"\n")
+            conn, _ = srv.accept()
+            with conn:
+                while True:
+                    data = conn.recv(1 << 16)
+                    if not data:
+                        return
+                    count["lines"] += data.count(b"\n")
+        except OSError:
+            pass
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+
+    def stop():
+        if proto == "udp":
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.sendto(b"bye", addr)
+        t.join(timeout=2.0)
+        srv.close()
+    return addr, count, stop
+
+
+def bench_outbox(args):
+    # pushes preloaded acks through NetworkOutbox into a local sink, per batch size.
+    # batch=1 is one write (or datagram) per ack, i.e. the unbatched baseline
+    ack = Ack(Kind.UPDATE_OK, Msg(Kind.UPDATE, "P00001", ts=0.0, delta=-3), 0.0)
+    rows = []
+    for proto in args.proto:
+        for b in args.batch:
+            addr, count, stop_sink = _sink(proto)
+            out_q: queue.Queue = queue.Queue()
+            for _ in range(args.acks):
+                out_q.put_nowait(ack)
+            send_stop(out_q)
+            ob = NetworkOutbox("outbox", out_q, threading.Event(), dest=addr, proto=proto,
+                               max_batch=b, flush_interval=args.flush_ms / 1000.0)
+            ob.start()
+            ob.join()
+            stop_sink()
+            m = ob.metrics()
+            elapsed = ob.stopped - ob.started
+            row = dict(m, max_batch=b, acks_per_sec=round(m["acks_sent"] / elapsed), received=count["lines"])
+            rows.append(row)
+            print(f"{proto} batch={b:<5} {row['acks_per_sec']:>9} acks/s {m['batches_per_sec']:>10.0f} batches/s "
+                  f"{m['bytes_per_sec'] / 1e6:7.1f} MB/s  received={count['lines']} dropped={m['send_dropped']}")
+    if args.json:
+        print(json.dumps(rows))
+
+
+@dataclass
+class _DataclassMsg:
+    # the previous Msg, kept as the "before" baseline for `alloc`
+    kind: str
+    player_id: str
+    payload: dict = field(default_factory=dict)
+    ts: float = field(default_factory=time.time)
+
+
+def _inputs(n: int, players: int, seed: int) -> list:
+    # (wire kind, Kind, fresh id string, delta) per message, same mix as make_messages. built
+    # up front so `alloc` times only the message construction, not the random draws
+    rng = random.Random(seed)
+    kinds = rng.choices([Kind.JOIN, Kind.UPDATE, Kind.LEAVE], weights=(0.1, 0.8, 0.1), k=n)
+    return [(k.value, k, f"P{rng.randrange(players):05d}", rng.randint(-7, 5) if k is Kind.UPDATE else 0)
+            for k in kinds]
+
+
+def _old_messages(inputs: list) -> list:
+    # built the old way: a fresh id string and payload dict each
+    return [_DataclassMsg(kind=kind, player_id=pid, payload={"delta": delta} if kind == "update" else {}, ts=0.0)
+            for kind, _, pid, delta in inputs]
+
+
+def _new_messages(inputs: list) -> list:
+    # ids are interned here, as Msg.from_json does for ids that come off the wire
+    intern = sys.intern
+    return [Msg(kind, intern(pid), ts=0.0, delta=delta) for _, kind, pid, delta in inputs]
+
+
+def _old_acks(msgs: list) -> list:
+    # the old _emit_ack: a payload dict plus a whole new message per processed message
+    return [_DataclassMsg(kind="update.ok", player_id=m.player_id, payload={"src": m.kind, "t": time.time()})
+            for m in msgs]
+
+
+def _new_acks(msgs: list) -> list:
+    return [Ack(Kind.UPDATE_OK, m, time.time()) for m in msgs]
+
+
+def _measure(fn, *a, reps: int = 3):
+    # (seconds, bytes still allocated by the result) -- best of `reps`, timed without
+    # tracemalloc running and after a full collection, so garbage from an earlier row
+    # does not bill its GC passes to this one
+    dt = float("inf")
+    for _ in range(reps):
+        gc.collect()
+        t0 = time.perf_counter()
+        out = fn(*a)
+        dt = min(dt, time.perf_counter() - t0)
+        del out
+    tracemalloc.start()
+    out = fn(*a)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del out
+    return dt, size
+
+
+def bench_alloc(args):
+    # bytes and ns per message / per ack, old dataclass path vs slotted Msg + Ack, then
+    # end-to-end worker throughput with the new types
+    n = args.messages
+    rows = []
+    inputs = _inputs(n, args.players, args.seed)
+    for name, make, ack in (("dataclass (before)", _old_messages, _old_acks),
+                            ("slots (after)", _new_messages, _new_acks)):
+        dt, size = _measure(make, inputs)
+        msgs = make(inputs)
+        adt, asize = _measure(ack, msgs)
+        row = {"mode": name, "msg_bytes": round(size / n, 1), "msg_ns": round(dt / n * 1e9),
+               "ack_bytes": round(asize / n, 1), "ack_ns": round(adt / n * 1e9)}
+        rows.append(row)
+        print(f"{name:>18}: msg {row['msg_bytes']:6.1f} B {row['msg_ns']:5} ns   "
+              f"ack {row['ack_bytes']:6.1f} B {row['ack_ns']:5} ns")
+        del msgs
+    msgs = make_messages(n, args.players, args.seed)
+    rate = run_workers(msgs, 1, 0, args.players)
+    rows.append({"mode": "worker", "msgs_per_sec": round(rate)})
+    print(f"{'worker':>18}: {rate:.0f} msgs/s (one SimulationWorker, acks included)")
+    if args.json:
+        print(json.dumps(rows))
+
+
+def _spurious_full(slots, probe, joins: int) -> int:
+    # `joins` players each try to take one of exactly `joins` slots while another thread
+    # keeps probing the free count; every refusal is a spurious join.full
+    stop = threading.Event()
+
+    def prober():
+        while not stop.is_set():
+            probe()
+
+    t = threading.Thread(target=prober, daemon=True)
+    t.start()
+    refused = 0
+    for _ in range(joins):
+        if not slots.acquire(blocking=False):
+            refused += 1
+        time.sleep(0)  # let the prober run between joins
+    stop.set()
+    t.join()
+    return refused
+
+
+def _peek(sem: threading.Semaphore):
+    # the old LoggerWorker._peek_free_slots
+    if sem.acquire(blocking=False):
+        sem.release()
+
+
+def bench_capacity(args):
+    # 1) spurious join.full: the old try-acquire probe vs reading CapacityManager.free
+    # 2) a join/leave churn at full capacity through the worker, for each admission queue
+    #    size: how many joins are turned away and the utilization percentiles
+    rows = []
+    n = args.max_players
+    for name in ("semaphore+probe", "capacity-manager"):
+        refused = 0
+        for _ in range(args.trials):
+            if name == "semaphore+probe":
+                sem = threading.Semaphore(n)
+                refused += _spurious_full(sem, lambda: _peek(sem), n)
+            else:
+                cap = CapacityManager(n)
+                refused += _spurious_full(cap, lambda: cap.free, n)
+        rows.append({"probe": name, "joins": n * args.trials, "spurious_full": refused})
+        print(f"{name:>18}: {refused} spurious join.full out of {n * args.trials} joins")
+
+    # joins and leaves only (updates would implicit-join past capacity), over twice as many
+    # players as slots, so joins regularly find the node full
+    msgs = make_messages(args.messages, 2 * n, args.seed, weights=(0.5, 0.0, 0.5))
+    for q in args.queue:
+        slots = CapacityManager(n, max_waiting=q, wait_timeout=args.join_timeout)
+        out_q: queue.Queue = queue.Queue()
+        rate = run_workers(msgs, 1, 0, n, slots=slots, out_q=out_q)
+        full = sum(1 for a in out_q.queue if a is not STOP and a.kind is Kind.JOIN_FULL)
+        st = slots.stats()
+        row = {"admission_queue": q, "msgs_per_sec": round(rate), "join_full": full,
+               "admitted_from_queue": st["admitted_from_queue"], "mean_wait_ms": st["mean_wait_ms"],
+               "utilization": st["utilization"]}
+        rows.append(row)
+        u = st["utilization"]
+        print(f"queue={q:<5} join.full={full:<7} admitted_from_queue={st['admitted_from_queue']:<7} "
+              f"util p50/p90/p99={u['p50']}/{u['p90']}/{u['p99']}  {rate:.0f} msgs/s")
+    if args.json:
+        print(json.dumps(rows))
+
+
+STAGES = ("enqueue_process", "process_outbox", "enqueue_outbox")
+
+
+def _flat(row: dict) -> dict:
+    # one csv column per stage/percentile
+    out = {k: v for k, v in row.items() if k != "latency"}
+    for stage in STAGES:
+        for k, v in row["latency"][stage].items():
+            out[f"{stage}_{k}"] = v
+    return out
+
+
+def bench_sweep(args):
+    # run_bench over the grid; every cell uses the same seeded workload, and --repeat runs
+    # each cell several times (the rows keep the repeat index)
+    rows = []
+    grid = itertools.product(args.producers, args.queue, args.locks, args.workers, args.batch, range(args.repeat))
+    for producers, q, locks, workers, batch, rep in grid:
+        r = run_bench(messages=args.messages, producers=producers, inbound_q=q, outbound_q=args.outbound_q,
+                      workers=workers, lock_mode=locks, batch=batch, max_players=args.max_players,
+                      players=args.players, seed=args.seed)
+        r["repeat"] = rep
+        rows.append(r)
+        e2e = r["latency"]["enqueue_outbox"]
+        print(f"producers={producers:<3} q={q:<6} locks={locks:<8} workers={workers:<3} batch={batch:<4} "
+              f"{r['msgs_per_sec']:>8} msgs/s  e2e p50/p99/p99.9 = {e2e['p50_us']}/{e2e['p99_us']}/"
+              f"{e2e['p999_us']} us  dropped={r['acks_dropped']}{'' if r['completed'] else '  INCOMPLETE'}")
+    if args.csv:
+        flat = [_flat(r) for r in rows]
+        with open(args.csv, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(flat[0]))
+            w.writeheader()
+            w.writerows(flat)
+        print(f"wrote {len(flat)} rows to {args.csv}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"wrote {len(rows)} rows to {args.json_out}")
+
+
+def bench_trace(args):
+    # writes a seeded trace for os_concurrency_node.py --replay
+    weights = (args.join, 1 - args.join - args.leave, args.leave)
+    n = record_trace(args.out, make_messages(args.messages, args.players, args.seed, weights=weights))
+    print(f"wrote {n} messages to {args.out}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("state", help="msgs/sec vs worker count, single lock vs striped")
+    p.add_argument("--messages", type=int, default=200_000)
+    p.add_argument("--players", type=int, default=10_000)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--stripes", type=int, default=16)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true", help="also print the rows as json")
+    p.set_defaults(func=bench_state)
+
+    p = sub.add_parser("churn", help="join/leave ratio sweep, list vs ordered set for player_order")
+    p.add_argument("--messages", type=int, default=50_000)
+    p.add_argument("--players", type=int, default=20_000)
+    p.add_argument("--ratios", type=float, nargs="+", default=[0.05, 0.25, 0.45],
+                   help="share of joins and of leaves each (the rest are updates)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=bench_churn)
+
+    p = sub.add_parser("batch", help="per-message vs batch-draining worker (and NumPy health)")
+    p.add_argument("--messages", type=int, default=200_000)
+    p.add_argument("--players", type=int, default=500)
+    p.add_argument("--batch", type=int, nargs="+", default=[64, 256, 1024])
+    p.add_argument("--repeat", type=int, default=3, help="rounds over every config, best run kept")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("lifecycle", help="idle CPU and shutdown time, 0.2 s polling vs STOP sentinels")
+    p.add_argument("--nodes", type=int, default=100)
+    p.add_argument("--idle", type=float, default=5.0, help="seconds to sit idle while measuring CPU")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=bench_lifecycle)
+
+    p = sub.add_parser("outbox", help="NetworkOutbox throughput vs max batch size, tcp and udp")
+    p.add_argument("--acks", type=int, default=100_000)
+    p.add_argument("--batch", type=int, nargs="+", default=[1, 16, 64, 256])
+    p.add_argument("--proto", nargs="+", choices=["tcp", "udp"], default=["tcp", "udp"])
+    p.add_argument("--flush-ms", type=float, default=10.0)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=bench_outbox)
+
+    p = sub.add_parser("alloc", help="tracemalloc bytes and ns per message/ack, dataclass vs slotted types")
+    p.add_argument("--messages", type=int, default=200_000)
+    p.add_argument("--players", type=int, default=1_000)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=bench_alloc)
+
+    p = sub.add_parser("capacity", help="spurious join.full from probing, admission queue sweep")
+    p.add_argument("--max-players", type=int, default=64)
+    p.add_argument("--trials", type=int, default=50)
+    p.add_argument("--messages", type=int, default=100_000)
+    p.add_argument("--queue", type=int, nargs="+", default=[0, 16, 64])
+    p.add_argument("--join-timeout", type=float, default=1.0)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=bench_capacity)
+
+    p = sub.add_parser("sweep", help="seeded latency/throughput grid over producers, queue sizes and lock modes")
+    p.add_argument("--messages", type=int, default=50_000)
+    p.add_argument("--producers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--queue", type=int, nargs="+", default=[64, 256, 1024], help="inbound queue sizes")
+    p.add_argument("--outbound-q", type=int, default=100_000)
+    p.add_argument("--locks", nargs="+", choices=["global", "striped", "none"], default=["global", "striped"])
+    p.add_argument("--workers", type=int, nargs="+", default=[1])
+    p.add_argument("--batch", type=int, nargs="+", default=[0])
+    p.add_argument("--max-players", type=int, default=64)
+    p.add_argument("--players", type=int, default=64)
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--csv", help="write the rows here as csv")
+    p.add_argument("--json-out", help="write the rows here as json")
+    p.set_defaults(func=bench_sweep)
+
+    p = sub.add_parser("trace", help="record a seeded JSONL trace for --replay")
+    p.add_argument("--out", default="trace.jsonl")
+    p.add_argument("--messages", type=int, default=500_000)
+    p.add_argument("--players", type=int, default=1_000)
+    p.add_argument("--join", type=float, default=0.1, help="share of joins")
+    p.add_argument("--leave", type=float, default=0.1, help="share of leaves (the rest are updates)")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_trace)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+from pipelined_2pc import start_cluster, stop_cluster
+
+# commits/sec and commit latency of the long-lived coordinator
+#
+# each row starts a fresh cluster with N participants and keeps `inflight`
+# transactions open at once (a new one is submitted as soon as one is decided).
+# inflight=1 is the old way: one round at a time.
+#
+# --wal adds rows with a write-ahead log on every node (see wal.py): "per-record" fsyncs
+# each record, "group" shares one fsync per group commit window (--group-ms)
+#
+# usage: python bench_2pc.py [--participants 3 10 50] [--inflight 1 64 512] [--txs 20000]
+#        python bench_2pc.py --participants 3 --inflight 64 --wal none per-record group
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(len(sorted_vals) * p / 100.0)) - 1)
+    return sorted_vals[max(0, i)]
+
+
+def run(participants, inflight, txs, timeout, wal="none", group_ms=2.0):
+    wal_dir = None if wal == "none" else tempfile.mkdtemp(prefix="bench2pc-")
+    coord, parts = start_cluster(["commit"] * participants, timeout=timeout,
+                                 wal_dir=wal_dir, wal_mode=wal, group_ms=group_ms)
+    latencies = []
+    finished = threading.Event()
+    submitted = [0]
+
+    # keeps `inflight` transactions open: every decision submits the next one
+    # (runs on the coordinator thread, so no locking needed)
+    def on_done(tx):
+        latencies.append(tx.latency)
+        if submitted[0] < txs:
+            submitted[0] += 1
+            coord.submit("Player1", on_done)
+        elif len(latencies) == txs:
+            finished.set()
+
+    t0 = time.perf_counter()
+    for _ in range(min(inflight, txs)):
+        submitted[0] += 1
+        coord.submit("Player1", on_done)
+    finished.wait()
+    elapsed = time.perf_counter() - t0
+    stop_cluster(coord, parts)
+    fsyncs = sum(n.wal.fsyncs for n in [coord] + parts if n.wal is not None)
+    if wal_dir is not None:
+        shutil.rmtree(wal_dir)
+
+    latencies.sort()
+    return {
+        "participants": participants,
+        "inflight": inflight,
+        "wal": wal,
+        "fsyncs": fsyncs,
+        "txs": txs,
+        "commits": coord.commits,
+        "aborts": coord.aborts,
+        "commits_per_sec": round(coord.commits / elapsed),
+        "p50_ms": round(percentile(latencies, 50) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1e3, 3),
+        "batches_sent": coord.batches_sent,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--participants", type=int, nargs="+", default=[3, 10, 50])
+    ap.add_argument("--inflight", type=int, nargs="+", default=[1, 64, 512])
+    ap.add_argument("--txs", type=int, default=20000)
+    ap.add_argument("--timeout", type=float, default=5.0)
+    ap.add_argument("--wal", nargs="+", choices=["none", "per-record", "group"], default=["none"])
+    ap.add_argument("--group-ms", type=float, default=2.0)
+    ap.add_argument("--json", action="store_true", help="also print the rows as json")
+    args = ap.parse_args()
+
+    rows = []
+    for wal in args.wal:
+        for n in args.participants:
+            for inflight in args.inflight:
+                # one-at-a-time rounds (and fsync per record) are slow; keep those rows short
+                txs = min(args.txs, 2000) if inflight == 1 or wal == "per-record" else args.txs
+                r = run(n, inflight, txs, args.timeout, wal, args.group_ms)
+                rows.append(r)
+                print(f"wal={wal:<10} participants={n:<3} inflight={inflight:<4} "
+                      f"{r['commits_per_sec']:>7} commits/s  p50={r['p50_ms']:.2f} ms  "
+                      f"p99={r['p99_ms']:.2f} ms  batches={r['batches_sent']}  fsyncs={r['fsyncs']}")
+    if args.json:
+        print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    main()
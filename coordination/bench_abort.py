@@ -0,0 +1,105 @@
+import argparse
+import json
+import queue
+import time
+
+from coordination_2pc import Coordinator, Participant
+
+# round latency of coordination_2pc.py when some participant votes abort or never answers
+#
+# mixes (N participants, the rest vote commit):
+#   abort+timeout  one aborts, one never votes (scenario_abort, scaled up)
+#   timeout        one never votes
+# modes:
+#   fixed     the old behavior: wait for every vote or the full --timeout
+#   early     decide ABORT on the first VOTE_ABORT
+#   adaptive  early abort plus per-participant timeouts learned from vote latency
+# one Coordinator runs all rounds of a row, so the adaptive timer keeps what it learned.
+#
+# usage: python bench_abort.py [--participants 3 10 50] [--rounds 200] [--timeout 0.5]
+
+MIXES = ("abort+timeout", "timeout")
+MODES = {
+    "fixed": dict(early_abort=False, adaptive=False),
+    "early": dict(early_abort=True, adaptive=False),
+    "adaptive": dict(early_abort=True, adaptive=True),
+}
+
+
+def behaviors(mix, n):
+    out = ["commit"] * n
+    out[-1] = "timeout"
+    if mix == "abort+timeout":
+        out[-2] = "abort"
+    return out
+
+
+def percentile(sorted_vals, p):
+    i = min(len(sorted_vals) - 1, int(round(len(sorted_vals) * p / 100.0)) - 1)
+    return sorted_vals[max(0, i)]
+
+
+def run(mix, mode, n, rounds, timeout):
+    coord_inbox = queue.Queue()
+    kinds = behaviors(mix, n)
+    inboxes = [queue.Queue() for _ in kinds]
+    names = [f"P{i}" for i in range(n)]
+    coord = Coordinator(list(zip(names, inboxes)), coord_inbox, timeout=timeout, quiet=True, **MODES[mode])
+
+    latencies = []
+    skipped = 0
+    for _ in range(rounds):
+        # participants exit on the decision, so every round gets fresh threads
+        parts = [Participant(name, inbox, coord_inbox, kind, quiet=True)
+                 for name, inbox, kind in zip(names, inboxes, kinds)]
+        for p in parts:
+            p.start()
+        t0 = time.perf_counter()
+        decision = coord.run_2pc("Player1")
+        latencies.append(time.perf_counter() - t0)
+        assert decision == "ABORT"
+        for p in parts:
+            p.join()
+            skipped += p.skipped
+
+    latencies.sort()
+    return {
+        "mix": mix,
+        "mode": mode,
+        "participants": n,
+        "rounds": rounds,
+        "p50_ms": round(percentile(latencies, 50) * 1e3, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1e3, 2),
+        "max_ms": round(latencies[-1] * 1e3, 2),
+        "total_s": round(sum(latencies), 2),
+        "skipped_prepares": skipped,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--participants", type=int, nargs="+", default=[3, 10, 50])
+    ap.add_argument("--mix", nargs="+", choices=MIXES, default=list(MIXES))
+    ap.add_argument("--mode", nargs="+", choices=list(MODES), default=list(MODES))
+    ap.add_argument("--rounds", type=int, default=200)
+    ap.add_argument("--timeout", type=float, default=0.5, help="fixed vote timeout (and adaptive ceiling)")
+    ap.add_argument("--json", action="store_true", help="also print the rows as json")
+    args = ap.parse_args()
+
+    rows = []
+    for mix in args.mix:
+        for n in args.participants:
+            for mode in args.mode:
+                # every round of a waiting mode costs the full timeout; keep those rows short
+                waits = mode == "fixed" or (mix == "timeout" and mode == "early")
+                rounds = min(args.rounds, 20) if waits else args.rounds
+                r = run(mix, mode, n, rounds, args.timeout)
+                rows.append(r)
+                print(f"{mix:<14} participants={n:<3} {mode:<9} p50={r['p50_ms']:>7.2f} ms  "
+                      f"p99={r['p99_ms']:>7.2f} ms  max={r['max_ms']:>7.2f} ms  rounds={rounds}")
+    if args.json:
+        print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import queue
+import time
+
+from coordination_2pc import Coordinator, Participant
+from net_2pc import TcpTransport, remote_coordinator, spawn_participant
+
+# rounds/sec of 2PC: in-process queues vs TCP to participant processes on localhost
+#
+#   queue        coordination_2pc.Coordinator + Participant threads in this process
+#   tcp          the same Coordinator.run_2pc, participants in their own processes
+#   tcp-async    TcpTransport.run_round with `inflight` rounds at once on the pooled
+#                connections (pipelined by request id)
+# every participant votes commit, so each round is a full PREPARE/VOTE/COMMIT.
+#
+# usage: python bench_net_2pc.py [--participants 3] [--rounds 5000] [--inflight 1 16 128] [--pool 1 4]
+
+
+def bench_queue(n, rounds):
+    coord_inbox = queue.Queue()
+    parts = [Participant(f"P{i}", queue.Queue(), coord_inbox, quiet=True, persistent=True) for i in range(n)]
+    for p in parts:
+        p.start()
+    coord = Coordinator([(p.name, p.inbox) for p in parts], coord_inbox, quiet=True)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        coord.run_2pc("Player1")
+    elapsed = time.perf_counter() - t0
+    for p in parts:
+        p.inbox.put({"type": "STOP"})
+        p.join()
+    return elapsed
+
+
+def bench_tcp(peers, rounds, pool):
+    transport = TcpTransport(peers, pool_size=pool, inbox=queue.Queue()).start()
+    coord = remote_coordinator(transport, quiet=True)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        coord.run_2pc("Player1")
+    elapsed = time.perf_counter() - t0
+    transport.close()
+    return elapsed
+
+
+def bench_tcp_async(peers, rounds, pool, inflight):
+    transport = TcpTransport(peers, pool_size=pool).start()
+
+    async def drive():
+        left = [rounds]
+
+        async def lane():
+            while left[0] > 0:
+                left[0] -= 1
+                await transport.run_round("Player1")
+
+        await asyncio.gather(*(lane() for _ in range(inflight)))
+
+    t0 = time.perf_counter()
+    transport.call(drive())
+    elapsed = time.perf_counter() - t0
+    transport.close()
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--participants", type=int, default=3)
+    ap.add_argument("--rounds", type=int, default=5000)
+    ap.add_argument("--inflight", type=int, nargs="+", default=[1, 16, 128])
+    ap.add_argument("--pool", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--json", action="store_true", help="also print the rows as json")
+    args = ap.parse_args()
+
+    rows = []
+
+    def report(transport, pool, inflight, elapsed):
+        row = {"transport": transport, "participants": args.participants, "pool": pool,
+               "inflight": inflight, "rounds": args.rounds,
+               "rounds_per_sec": round(args.rounds / elapsed)}
+        rows.append(row)
+        print(f"{transport:<10} pool={pool:<3} inflight={inflight:<4} {row['rounds_per_sec']:>7} rounds/s")
+
+    report("queue", "-", 1, bench_queue(args.participants, args.rounds))
+
+    procs, peers = [], {}
+    for i in range(args.participants):
+        proc, port = spawn_participant(f"P{i}")
+        procs.append(proc)
+        peers[f"P{i}"] = ("127.0.0.1", port)
+    try:
+        for pool in args.pool:
+            report("tcp", pool, 1, bench_tcp(peers, args.rounds, pool))
+            for inflight in args.inflight:
+                report("tcp-async", pool, inflight, bench_tcp_async(peers, args.rounds, pool, inflight))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+    if args.json:
+        print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    main()
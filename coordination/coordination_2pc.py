@@ -1,85 +1,188 @@
 import threading
 import queue
 import time
+from collections import deque
+
+# PREPARE carries a "round" number and a "deadline" (time.time() value). a participant that
+# gets a PREPARE after its deadline skips the work: the coordinator has stopped waiting.
+# votes echo the round, so a late vote from an earlier round is never counted.
 
 # participant runs in its own thread and talks to the coordinator
 class Participant(threading.Thread):
-    def __init__(self, name, inbox, coord_outbox, behavior="commit"):
+    def __init__(self, name, inbox, coord_outbox, behavior="commit", quiet=False, persistent=False):
         super().__init__(daemon=True)
         self.name = name
         self.inbox = inbox          # messages from coordinator
         self.coord_outbox = coord_outbox  # messages to coordinator
         self.behavior = behavior    # "commit", "abort", or "timeout"
+        self.quiet = quiet
+        self.persistent = persistent  # keep serving rounds after a decision (only STOP ends it)
+        self.skipped = 0            # PREPAREs that arrived after their deadline
+
+    def log(self, text):
+        if not self.quiet:
+            print(text)
 
     def run(self):
+        # blocks in get() until a message arrives; exits on the final decision or a STOP
         while True:
             msg = self.inbox.get()
-            mtype = msg.get("type")
-
-            if mtype == "PREPARE":
-                winner = msg.get("winner")
-                print(f"{self.name} got PREPARE for {winner}")
-
-                if self.behavior == "timeout":
-                    # simulate slow or dead node
-                    print(f"{self.name} is timing out (no vote)")
-                    continue
-
-                # decide which vote to send back
-                if self.behavior == "abort":
-                    vote = "VOTE_ABORT"
-                else:
-                    vote = "VOTE_COMMIT"
-
-                print(f"{self.name} sends {vote}")
-                self.coord_outbox.put({"from": self.name, "type": vote})
-
-            elif mtype in ("COMMIT", "ABORT"):
-                # final result from coordinator
-                print(f"{self.name} final result = {mtype}")
-                break
+            try:
+                if not self.handle(msg):
+                    break
+            finally:
+                self.inbox.task_done()
 
-            self.inbox.task_done()
+    # returns False once this participant is done
+    def handle(self, msg):
+        mtype = msg.get("type")
+
+        if mtype == "PREPARE":
+            winner = msg.get("winner")
+            self.log(f"{self.name} got PREPARE for {winner}")
+
+            deadline = msg.get("deadline")
+            if deadline is not None and time.time() > deadline:
+                # coordinator gave up on us already, a vote would be thrown away
+                self.skipped += 1
+                self.log(f"{self.name} skips an expired PREPARE")
+                return True
+
+            if self.behavior == "timeout":
+                # simulate slow or dead node
+                self.log(f"{self.name} is timing out (no vote)")
+                return True
+
+            # decide which vote to send back
+            if self.behavior == "abort":
+                vote = "VOTE_ABORT"
+            else:
+                vote = "VOTE_COMMIT"
+
+            self.log(f"{self.name} sends {vote}")
+            self.coord_outbox.put({"from": self.name, "type": vote, "round": msg.get("round")})
+
+        elif mtype in ("COMMIT", "ABORT"):
+            # final result from coordinator
+            self.log(f"{self.name} final result = {mtype}")
+            return self.persistent
+
+        elif mtype == "STOP":
+            # poison pill: leave without a decision (node shutting down)
+            return False
+
+        return True
+
+
+# per-participant vote timeouts learned from how long votes actually take.
+# timeout = margin * max(EWMA, pct-th percentile of the last `window` votes), kept
+# between floor and ceiling. a participant with fewer than min_samples votes uses the
+# estimate over everyone; before any vote at all it is the ceiling (the fixed timeout).
+# the 50 ms floor stays well above thread scheduling jitter (the GIL switch interval is
+# 5 ms), so a busy process does not turn slow-but-valid votes into spurious aborts.
+class VoteTimer:
+    def __init__(self, ceiling, floor=0.05, alpha=0.2, pct=99, window=64, margin=2.0, min_samples=5):
+        self.ceiling = ceiling
+        self.floor = floor
+        self.alpha = alpha
+        self.pct = pct
+        self.margin = margin
+        self.min_samples = min_samples
+        self.window = window
+        self.ewma = {}              # name -> smoothed vote latency
+        self.recent = {}            # name -> deque of recent vote latencies
+        self.all_recent = deque(maxlen=window)
+        self.all_ewma = None
+
+    def observe(self, name, seconds):
+        old = self.ewma.get(name)
+        self.ewma[name] = seconds if old is None else old + self.alpha * (seconds - old)
+        self.recent.setdefault(name, deque(maxlen=self.window)).append(seconds)
+        self.all_ewma = seconds if self.all_ewma is None else self.all_ewma + self.alpha * (seconds - self.all_ewma)
+        self.all_recent.append(seconds)
+
+    def _estimate(self, ewma, samples):
+        ordered = sorted(samples)
+        tail = ordered[min(len(ordered) - 1, int(len(ordered) * self.pct / 100))]
+        return min(self.ceiling, max(self.floor, self.margin * max(ewma, tail)))
+
+    def timeout_for(self, name):
+        samples = self.recent.get(name)
+        if samples is not None and len(samples) >= self.min_samples:
+            return self._estimate(self.ewma[name], samples)
+        if len(self.all_recent) >= self.min_samples:
+            return self._estimate(self.all_ewma, self.all_recent)
+        return self.ceiling
 
 
 # coordinator sends prepare, collects votes, and decides commit or abort
 class Coordinator:
-    def __init__(self, participants, inbox, timeout=2.0):
+    def __init__(self, participants, inbox, timeout=2.0, early_abort=True, adaptive=False, quiet=False):
         self.participants = participants    # list of (name, queue)
         self.inbox = inbox                  # votes from participants
         self.timeout = timeout              # max wait time for votes
+        self.early_abort = early_abort      # decide ABORT on the first VOTE_ABORT
+        self.timer = VoteTimer(timeout) if adaptive else None  # opt-in: can abort a slow but healthy vote
+        self.quiet = quiet
+        self.round = 0
+        self.sent_at = {}                   # round -> PREPARE time, to time late votes too
+
+    def log(self, text):
+        if not self.quiet:
+            print(text)
 
     def run_2pc(self, winner):
-        print("")
-        print("PREPARE PHASE")
-        print("coordinator asks everyone to vote")
+        self.log("")
+        self.log("PREPARE PHASE")
+        self.log("coordinator asks everyone to vote")
+
+        self.round += 1
+        rnd = self.round
+        start = time.time()
+        self.sent_at[rnd] = start
+        self.sent_at.pop(rnd - 16, None)
 
-        # send prepare to all participants
+        # each participant is only waited for up to its own timeout; the deadline goes
+        # into PREPARE so a participant that is behind can skip the round
+        deadlines = {}
         for name, inbox in self.participants:
-            inbox.put({"type": "PREPARE", "winner": winner})
+            limit = self.timer.timeout_for(name) if self.timer else self.timeout
+            deadlines[name] = start + limit
+            inbox.put({"type": "PREPARE", "winner": winner, "round": rnd, "deadline": deadlines[name]})
 
         votes = {}
-        start = time.time()
 
-        # collect votes until all are in or timeout happens
+        # collect votes until all are in, one is an abort, or someone runs out of time
+        # (a missing vote means ABORT, so the earliest open deadline ends the round)
         while len(votes) < len(self.participants):
-            left = self.timeout - (time.time() - start)
+            left = min(d for name, d in deadlines.items() if name not in votes) - time.time()
             if left <= 0:
-                print("coordinator timed out waiting for votes")
+                self.log("coordinator timed out waiting for votes")
                 break
 
             try:
                 msg = self.inbox.get(timeout=left)
             except queue.Empty:
-                print("no more votes received")
+                self.log("no more votes received")
                 break
+            self.inbox.task_done()
 
             sender = msg.get("from")
             vtype = msg.get("type")
-            if sender and vtype in ("VOTE_COMMIT", "VOTE_ABORT"):
-                print(f"coordinator got {vtype} from {sender}")
-                votes[sender] = vtype
-                self.inbox.task_done()
+            if not sender or vtype not in ("VOTE_COMMIT", "VOTE_ABORT"):
+                continue
+            vround = msg.get("round", rnd)
+            if self.timer is not None and vround in self.sent_at and not msg.get("unreachable"):
+                # late votes from earlier rounds still teach the timer how slow a node is
+                # (an abort the transport made up for a lost connection says nothing about that)
+                self.timer.observe(sender, time.time() - self.sent_at[vround])
+            if vround != rnd:
+                continue
+            self.log(f"coordinator got {vtype} from {sender}")
+            votes[sender] = vtype
+            if vtype == "VOTE_ABORT" and self.early_abort:
+                self.log("coordinator got an abort, no need to wait for the rest")
+                break
 
         # decide global result
         if len(votes) == len(self.participants) and all(v == "VOTE_COMMIT" for v in votes.values()):
@@ -87,9 +190,9 @@ class Coordinator:
         else:
             decision = "ABORT"
 
-        print("")
-        print("DECISION PHASE")
-        print(f"coordinator decides: {decision}")
+        self.log("")
+        self.log("DECISION PHASE")
+        self.log(f"coordinator decides: {decision}")
 
         # send final result to everyone
         for name, inbox in self.participants:
@@ -121,7 +224,9 @@ def scenario_all_commit():
     coord = Coordinator(parts, coord_inbox)
     result = coord.run_2pc("Player1")
 
-    time.sleep(0.3)
+    # every participant exits on the decision, so join instead of sleeping
+    for p in (p1, p2, lb):
+        p.join()
     return result
 
 
@@ -148,7 +253,9 @@ def scenario_abort():
     coord = Coordinator(parts, coord_inbox)
     result = coord.run_2pc("Player1")
 
-    time.sleep(0.3)
+    # every participant exits on the decision, so join instead of sleeping
+    for p in (p1, p2, lb):
+        p.join()
     return result
 
 
@@ -0,0 +1,144 @@
+import argparse
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from pipelined_2pc import start_cluster, stop_cluster
+from wal import WAL
+
+# crash-recovery check for the WAL-backed pipelined 2PC
+#
+# a child process runs the coordinator and participants with WAL files and keeps
+# transactions in flight, printing "COMMIT <txid>" to stdout each time the client is told
+# a transaction committed. the parent SIGKILLs it at a random moment, starts it again on
+# the same files, and repeats. a last run recovers, waits until nothing is in doubt,
+# and shuts down cleanly. then the logs are checked:
+# - no participant is left with a PREPARED that has no decision
+# - every participant's decision matches the coordinator's (no split outcome)
+# - every commit a client was told about is a COMMIT in the coordinator log
+#
+# usage: python crash_2pc.py [--rounds 10] [--participants 3] [--mode group|per-record]
+
+
+def child(args):
+    coord, parts = start_cluster(["commit"] * args.participants, timeout=args.timeout,
+                                 wal_dir=args.dir, wal_mode=args.mode, group_ms=args.group_ms)
+    if args.recover_only:
+        # wait until every recovered decision was acked and no participant is in doubt
+        deadline = time.time() + 30
+        while coord.deciding or any(p.prepared for p in parts):
+            if time.time() > deadline:
+                print("STUCK", flush=True)
+                break
+            time.sleep(0.05)
+        stop_cluster(coord, parts)
+        return
+
+    # runs on the coordinator thread: report the outcome, then start the next transaction
+    def on_done(tx):
+        if tx.decision == "COMMIT":
+            sys.stdout.write(f"COMMIT {tx.txid}\n")
+            sys.stdout.flush()
+        coord.submit("Player1", on_done)
+
+    for _ in range(args.inflight):
+        coord.submit("Player1", on_done)
+    threading.Event().wait()    # until killed
+
+
+def decisions(path):
+    # txid -> last state seen in one log
+    state = {}
+    for rec in WAL.replay(path):
+        if "txid" in rec and rec["type"] != "END":
+            state[rec["txid"]] = rec["type"]
+    return state
+
+
+def check(wal_dir, participants, reported):
+    problems = []
+    coord = decisions(os.path.join(wal_dir, "coordinator.wal"))
+    for i in range(participants):
+        for txid, state in decisions(os.path.join(wal_dir, f"P{i}.wal")).items():
+            if state == "PREPARED":
+                problems.append(f"P{i}: tx {txid} still in doubt")
+            elif state == "COMMIT" and coord.get(txid) != "COMMIT":
+                problems.append(f"P{i}: committed tx {txid}, coordinator says {coord.get(txid)}")
+            elif state == "ABORT" and coord.get(txid) == "COMMIT":
+                problems.append(f"P{i}: aborted tx {txid} that the coordinator committed")
+    lost = [txid for txid in reported if coord.get(txid) != "COMMIT"]
+    if lost:
+        problems.append(f"{len(lost)} reported commits missing from the coordinator log, e.g. {lost[:5]}")
+    return coord, problems
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=10, help="how many times to kill the child")
+    ap.add_argument("--participants", type=int, default=3)
+    ap.add_argument("--inflight", type=int, default=64)
+    ap.add_argument("--mode", choices=["group", "per-record"], default="group")
+    ap.add_argument("--group-ms", type=float, default=2.0)
+    ap.add_argument("--timeout", type=float, default=2.0)
+    ap.add_argument("--min-run", type=float, default=0.5, help="seconds before a kill, at least")
+    ap.add_argument("--max-run", type=float, default=1.5, help="seconds before a kill, at most")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--keep", action="store_true", help="leave the wal directory behind")
+    # internal: set when this file starts itself as the child
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--recover-only", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--dir", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    rng = random.Random(args.seed)
+    wal_dir = tempfile.mkdtemp(prefix="crash2pc-")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", "--dir", wal_dir,
+           "--participants", str(args.participants), "--inflight", str(args.inflight),
+           "--mode", args.mode, "--group-ms", str(args.group_ms), "--timeout", str(args.timeout)]
+    reported = []
+
+    for rnd in range(args.rounds):
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        lines = []
+        reader = threading.Thread(target=lambda: lines.extend(proc.stdout), daemon=True)
+        reader.start()
+        time.sleep(rng.uniform(args.min_run, args.max_run))
+        proc.send_signal(signal.SIGKILL)
+        proc.wait()
+        reader.join()
+        # a line cut off by the kill never reached a client either
+        got = [int(l.split()[1]) for l in lines if l.startswith("COMMIT ") and l.endswith("\n")]
+        reported.extend(got)
+        print(f"round {rnd + 1}: killed after {len(got)} reported commits")
+
+    out = subprocess.run(cmd + ["--recover-only"], stdout=subprocess.PIPE, text=True)
+    if "STUCK" in out.stdout:
+        print("recovery did not settle within 30s")
+
+    coord, problems = check(wal_dir, args.participants, reported)
+    commits = sum(1 for d in coord.values() if d == "COMMIT")
+    aborts = sum(1 for d in coord.values() if d == "ABORT")
+    print(f"coordinator log: {commits} commits, {aborts} aborts; clients saw {len(reported)} commits")
+    if args.keep:
+        print(f"wal files in {wal_dir}")
+    else:
+        shutil.rmtree(wal_dir)
+    if problems:
+        for p in problems[:20]:
+            print("FAIL", p)
+        sys.exit(1)
+    print("OK: no in-doubt transactions, no split decisions, no lost commits")
+
+
+if __name__ == "__main__":
+    main()
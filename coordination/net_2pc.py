@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import itertools
+import json
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from coordination_2pc import Coordinator, Participant
+
+# two-phase commit between processes over TCP
+#
+# the messages are the same dicts as coordination_2pc.py, one json object per line.
+# every PREPARE also gets an "id" and the participant copies it into its vote, so a
+# connection can carry many PREPAREs at once (pipelining) and replies are matched by
+# id, not by order. COMMIT/ABORT/STOP are one-way.
+#   -> {"type": "PREPARE", "winner": "Player1", "round": 3, "deadline": 1712.5, "id": 41}
+#   <- {"from": "Player2", "type": "VOTE_COMMIT", "round": 3, "id": 41}
+#   -> {"type": "COMMIT", "round": 3}
+#
+# participant node: serve_participant() wraps a Participant and calls its handle() for
+# each line. coordinator: TcpTransport keeps a small pool of connections per participant
+# (opened once, reused by every round) and offers
+# - queue_for(name) / inbox: queue-like objects, so the unchanged Coordinator.run_2pc runs
+#   over the network
+# - run_round(): an asyncio round; many can be in flight at once over the same connections
+# a connection that closes is dropped from its pool and reopened in the background. the
+# requests it carried fail at once (a lost or unreachable participant counts as a
+# VOTE_ABORT, so the round aborts now instead of at its timeout)
+#
+# usage: python net_2pc.py participant --name Player1 --port 7101 [--behavior commit]
+#        python net_2pc.py coordinator --peer Player1=127.0.0.1:7101 --peer ...
+#        python net_2pc.py demo     (scenario_abort with every participant in its own process)
+
+
+def encode(msg):
+    return (json.dumps(msg) + "\n").encode()
+
+
+# ---------- participant side ----------
+
+# stands in for Participant.coord_outbox: the vote goes back on the connection it came from
+class _ReplyTo:
+    def __init__(self, writer, req_id):
+        self.writer = writer
+        self.req_id = req_id
+
+    def put(self, msg):
+        if self.req_id is not None:
+            msg["id"] = self.req_id
+        self.writer.write(encode(msg))
+
+
+async def serve_participant(participant, host="127.0.0.1", port=0, ready=None):
+    stop = asyncio.Event()
+
+    async def on_conn(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg.get("type") == "STOP":
+                    stop.set()
+                    break
+                # handle() runs on the event loop thread, so swapping the outbox is safe
+                participant.coord_outbox = _ReplyTo(writer, msg.get("id"))
+                participant.handle(msg)
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass    # node is stopping (STOP came in on another connection)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(on_conn, host, port)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await stop.wait()
+
+
+# ---------- coordinator side ----------
+
+class _RemoteInbox:
+    # queue-like handle on one remote participant, for Coordinator.participants
+    def __init__(self, transport, name):
+        self.transport = transport
+        self.name = name
+
+    def put(self, msg):
+        self.transport.loop.call_soon_threadsafe(self.transport._write, self.name, dict(msg), True)
+
+
+class TcpTransport:
+    def __init__(self, peers, pool_size=2, inbox=None, retry_sec=0.5):
+        self.peers = peers              # name -> (host, port)
+        self.pool_size = pool_size      # connections per participant
+        self.inbox = inbox              # replies nobody awaits (late votes, queue users)
+        self.retry_sec = retry_sec      # pause between reconnect attempts
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.pools = {}                 # name -> list of writers
+        self.pending = {}               # request id -> future
+        self.carried_by = {}            # request id -> writer it went out on
+        self.queued_round = {}          # writer -> round of an unanswered queue-user PREPARE
+        self.reconnecting = set()       # names with a reconnect task running
+        self.closing = False
+        self.ids = itertools.count(1)
+        self.picks = itertools.count()
+        self.rounds = itertools.count(1)
+        self.readers = []
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._connect(), self.loop).result()
+        return self
+
+    async def _connect(self):
+        for name in self.peers:
+            self.pools[name] = []
+            for _ in range(self.pool_size):
+                await self._open(name)
+
+    async def _open(self, name):
+        host, port = self.peers[name]
+        reader, writer = await asyncio.open_connection(host, port)
+        self.pools[name].append(writer)
+        self.readers.append(asyncio.ensure_future(self._read(name, reader, writer)))
+
+    async def _read(self, name, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                req_id = msg.get("id")
+                self.carried_by.pop(req_id, None)
+                fut = self.pending.pop(req_id, None)
+                if fut is not None:
+                    if not fut.done():
+                        fut.set_result(msg)
+                    continue
+                if self.queued_round.get(writer) == msg.get("round"):
+                    del self.queued_round[writer]
+                if self.inbox is not None:
+                    self.inbox.put(msg)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if not self.closing:
+                self._lost(name, writer)
+
+    # a connection to `name` closed (participant crashed or restarted)
+    def _lost(self, name, writer):
+        pool = self.pools.get(name, [])
+        if writer in pool:
+            pool.remove(writer)
+        writer.close()
+        for req_id, w in list(self.carried_by.items()):
+            if w is writer:
+                del self.carried_by[req_id]
+                self._unreachable(name, req_id)
+        if writer in self.queued_round:
+            self._unreachable(name, None, self.queued_round.pop(writer))
+        if name not in self.reconnecting:
+            self.reconnecting.add(name)
+            self.readers.append(asyncio.ensure_future(self._reconnect(name)))
+
+    # a PREPARE that cannot be answered: its awaiting request raises ConnectionError, a queue
+    # user (Coordinator.run_2pc) gets the participant's vote as VOTE_ABORT
+    def _unreachable(self, name, req_id, rnd=None):
+        fut = self.pending.pop(req_id, None) if req_id is not None else None
+        if fut is not None:
+            if not fut.done():
+                fut.set_exception(ConnectionError(f"connection to {name} lost"))
+        elif self.inbox is not None and rnd is not None:
+            self.inbox.put({"from": name, "type": "VOTE_ABORT", "round": rnd, "unreachable": True})
+
+    async def _reconnect(self, name):
+        try:
+            while not self.closing and len(self.pools[name]) < self.pool_size:
+                try:
+                    await self._open(name)
+                except OSError:
+                    await asyncio.sleep(self.retry_sec)
+        finally:
+            self.reconnecting.discard(name)
+
+    # loop thread only. PREPAREs get an id; the next connection of the pool takes it.
+    # with no connection left to `name` the PREPARE fails at once; COMMIT/ABORT are dropped
+    def _write(self, name, msg, with_id=False):
+        prepare = msg.get("type") == "PREPARE"
+        if with_id and prepare:
+            msg["id"] = next(self.ids)
+        req_id = msg.get("id")
+        pool = self.pools[name]
+        if not pool:
+            if prepare:
+                self._unreachable(name, req_id if req_id in self.pending else None, msg.get("round"))
+            return req_id
+        writer = pool[next(self.picks) % len(pool)]
+        writer.write(encode(msg))
+        if req_id in self.pending:
+            self.carried_by[req_id] = writer
+        elif prepare:
+            self.queued_round[writer] = msg.get("round")
+        return req_id
+
+    def queue_for(self, name):
+        return _RemoteInbox(self, name)
+
+    # asyncio API, call from the loop thread (e.g. inside run_round)
+    async def request(self, name, msg):
+        msg = dict(msg)
+        req_id = msg["id"] = next(self.ids)
+        fut = self.loop.create_future()
+        self.pending[req_id] = fut
+        try:
+            self._write(name, msg)
+            return await fut
+        finally:
+            self.pending.pop(req_id, None)
+            self.carried_by.pop(req_id, None)
+
+    def send(self, name, msg):
+        self._write(name, msg)
+
+    async def run_round(self, winner, timeout=2.0):
+        rnd = next(self.rounds)
+        prepare = {"type": "PREPARE", "winner": winner, "round": rnd, "deadline": time.time() + timeout}
+        waits = [asyncio.ensure_future(self.request(name, prepare)) for name in self.pools]
+        decision = "COMMIT"
+        try:
+            for next_vote in asyncio.as_completed(waits, timeout=timeout):
+                vote = await next_vote
+                if vote.get("type") != "VOTE_COMMIT":
+                    decision = "ABORT"  # early abort, the rest cannot change it
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            decision = "ABORT"  # a vote that cannot come is an abort too
+        finally:
+            for w in waits:
+                w.cancel()
+        for name in self.pools:
+            self.send(name, {"type": decision, "round": rnd})
+        return decision
+
+    # from any other thread
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _shutdown(self, stop_peers):
+        self.closing = True
+        for pool in self.pools.values():
+            for writer in pool:
+                if stop_peers:
+                    writer.write(encode({"type": "STOP"}))
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass
+        for task in self.readers:
+            task.cancel()
+
+    def close(self, stop_peers=False):
+        self.call(self._shutdown(stop_peers))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# Coordinator from coordination_2pc.py running over TCP
+def remote_coordinator(transport, **kwargs):
+    parts = [(name, transport.queue_for(name)) for name in transport.peers]
+    return Coordinator(parts, transport.inbox, **kwargs)
+
+
+# starts `python net_2pc.py participant` in a new process; returns (process, port)
+def spawn_participant(name, behavior="commit", quiet=True):
+    cmd = [sys.executable, __file__, "participant", "--name", name, "--behavior", behavior, "--port", "0"]
+    if quiet:
+        cmd.append("--quiet")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    port = int(proc.stdout.readline().split()[-1])
+    # pass the node's own output through instead of leaving it in the pipe
+    threading.Thread(target=lambda: sys.stdout.writelines(proc.stdout), daemon=True).start()
+    return proc, port
+
+
+def parse_peer(text):
+    name, addr = text.split("=", 1)
+    host, port = addr.rsplit(":", 1)
+    return name, (host, int(port))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("participant")
+    p.add_argument("--name", required=True)
+    p.add_argument("--behavior", choices=["commit", "abort", "timeout"], default="commit")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=7101)
+    p.add_argument("--quiet", action="store_true")
+    c = sub.add_parser("coordinator")
+    c.add_argument("--peer", action="append", required=True, help="NAME=HOST:PORT, once per participant")
+    c.add_argument("--winner", default="Player1")
+    c.add_argument("--timeout", type=float, default=2.0)
+    c.add_argument("--stop-peers", action="store_true", help="send STOP to the participants afterwards")
+    sub.add_parser("demo")
+    args = ap.parse_args()
+
+    if args.cmd == "participant":
+        node = Participant(args.name, None, None, args.behavior, quiet=args.quiet, persistent=True)
+        asyncio.run(serve_participant(node, args.host, args.port,
+                                      ready=lambda port: print(f"{args.name} listening on {port}", flush=True)))
+        return
+
+    if args.cmd == "coordinator":
+        peers = dict(parse_peer(text) for text in args.peer)
+        transport = TcpTransport(peers, inbox=queue.Queue()).start()
+        print("decision:", remote_coordinator(transport, timeout=args.timeout).run_2pc(args.winner))
+        transport.close(stop_peers=args.stop_peers)
+        return
+
+    # demo: scenario_abort from coordination_2pc.py, one process per participant
+    procs, peers = [], {}
+    for name, behavior in (("Player1", "commit"), ("Player2", "abort"), ("Leaderboard", "timeout")):
+        proc, port = spawn_participant(name, behavior, quiet=False)
+        procs.append(proc)
+        peers[name] = ("127.0.0.1", port)
+    transport = TcpTransport(peers, inbox=queue.Queue()).start()
+    result = remote_coordinator(transport).run_2pc("Player1")
+    transport.close(stop_peers=True)
+    for proc in procs:
+        proc.wait()
+    print("")
+    print("Scenario 2 over TCP:", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+
+from wal import WAL
+
+# long-lived two-phase commit: many transactions in flight at once, keyed by txid
+#
+# coordination_2pc.py runs one round and then its participants exit. here the
+# coordinator and participants are threads that stay up. every message carries a
+# "txid", so votes for different transactions can interleave on the one coordinator
+# inbox. the coordinator drains whatever has arrived (new transactions and votes),
+# then sends each participant ONE list holding all of its PREPAREs and decisions. a
+# participant answers the whole list with one list of votes, so queue traffic grows
+# with the number of wakeups, not with transactions x participants.
+#
+# message shapes are the same as coordination_2pc.py plus a txid:
+#   {"type": "PREPARE", "txid": 7, "winner": "Player1"}
+#   {"type": "VOTE_COMMIT", "txid": 7, "from": "Player2"}
+#   {"type": "COMMIT", "txid": 7}
+# queues carry either one dict or a list of them. {"type": "STOP"} ends a thread.
+#
+# durability (optional, pass a WAL from wal.py to both sides):
+# - a participant logs PREPARED before it votes commit, and logs each decision before it
+#   answers {"type": "ACK", "txid", "from"}. the whole batch shares one fsync wait
+# - the coordinator logs COMMIT/ABORT and only sends the decision (and tells the client)
+#   once the flusher says it is on disk. when every participant has acked, an END record
+#   is appended (no wait)
+# - restart: the coordinator re-sends every logged decision that has no END. a participant
+#   asks {"type": "STATUS", "txid", "from"} about every PREPARED without a decision, and
+#   the coordinator answers with the decision, or ABORT if it never logged one
+#   (presumed abort). a decision still waiting for its fsync is not answered: it is sent
+#   to everyone once durable. txids of a restarted coordinator start at epoch * TXID_EPOCH
+
+
+# a submitted transaction; wait() blocks until the coordinator decides.
+# on_done(tx) is called on the coordinator thread right after the decision
+class Tx:
+    def __init__(self, txid, winner, on_done=None):
+        self.txid = txid
+        self.winner = winner
+        self.on_done = on_done
+        self.votes = {}
+        self.decision = None
+        self.started = time.perf_counter()
+        self.finished = None
+        self.deadline = None
+        self.durable = False        # decision record is on disk (wal only)
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.decision
+
+    @property
+    def latency(self):
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+# participant that stays alive and answers every transaction it is asked about
+class TxParticipant(threading.Thread):
+    def __init__(self, name, inbox, coord_inbox, behavior="commit", wal=None):
+        super().__init__(daemon=True)
+        self.name = name
+        self.inbox = inbox
+        self.coord_inbox = coord_inbox
+        self.behavior = behavior    # "commit", "abort", or "timeout"
+        self.wal = wal
+        self.prepared = set()       # txids voted commit and waiting for the decision
+        self.committed = 0
+        self.aborted = 0
+        self.last_lsn = 0           # newest wal record of the batch being handled
+        if wal is not None:
+            self.recover(WAL.replay(wal.path))
+
+    # rebuild the in-doubt set from the log: prepared, but no decision seen
+    def recover(self, records):
+        for rec in records:
+            if rec["type"] == "PREPARED":
+                self.prepared.add(rec["txid"])
+            elif rec["type"] in ("COMMIT", "ABORT"):
+                self.prepared.discard(rec["txid"])
+
+    def run(self):
+        if self.prepared:
+            # in doubt after a restart: ask the coordinator how these ended
+            self.coord_inbox.put([{"type": "STATUS", "txid": txid, "from": self.name}
+                                  for txid in sorted(self.prepared)])
+        while True:
+            item = self.inbox.get()
+            msgs = item if isinstance(item, list) else [item]
+            votes = []
+            stop = False
+            self.last_lsn = 0
+            for msg in msgs:
+                if msg.get("type") == "STOP":
+                    stop = True
+                    break
+                vote = self.handle(msg)
+                if vote is not None:
+                    votes.append(vote)
+            if self.last_lsn:
+                # nothing leaves before the batch's records are on disk
+                self.wal.wait(self.last_lsn)
+            if votes:
+                # one reply for the whole batch
+                self.coord_inbox.put(votes)
+            self.inbox.task_done()
+            if stop:
+                break
+
+    def _log(self, rtype, txid):
+        if self.wal is not None:
+            self.last_lsn = self.wal.append({"type": rtype, "txid": txid})
+
+    # returns the vote to send back, or None
+    def handle(self, msg):
+        mtype = msg.get("type")
+        txid = msg.get("txid")
+
+        if mtype == "PREPARE":
+            if self.behavior == "timeout":
+                return None
+            if self.behavior == "abort":
+                return {"type": "VOTE_ABORT", "txid": txid, "from": self.name}
+            self.prepared.add(txid)
+            self._log("PREPARED", txid)
+            return {"type": "VOTE_COMMIT", "txid": txid, "from": self.name}
+
+        if mtype in ("COMMIT", "ABORT"):
+            self.prepared.discard(txid)
+            if mtype == "COMMIT":
+                self.committed += 1
+            else:
+                self.aborted += 1
+            if self.wal is not None:
+                self._log(mtype, txid)
+                return {"type": "ACK", "txid": txid, "from": self.name}
+        return None
+
+
+TXID_EPOCH = 1_000_000_000     # txids per coordinator restart (wal only)
+
+
+# coordinator thread running any number of transactions concurrently
+class TxCoordinator(threading.Thread):
+    def __init__(self, participants, inbox, timeout=2.0, max_drain=1024, wal=None):
+        super().__init__(daemon=True)
+        self.participants = participants    # list of (name, queue)
+        self.inbox = inbox                  # submissions and votes
+        self.timeout = timeout              # max wait time for votes, per transaction
+        self.max_drain = max_drain          # messages handled per wakeup
+        self.active = {}                    # txid -> Tx
+        self.deciding = {}                  # txid -> Tx, decided but not acked by everyone (wal only)
+        self.deadlines = []                 # heap of (deadline, txid)
+        self.next_txid = itertools.count(1)
+        self.commits = 0
+        self.aborts = 0
+        self.batches_sent = 0
+        self.wal = wal
+        self.resend = []                    # decisions to re-send after recovery
+        if wal is not None:
+            wal.on_flush = self._on_durable
+            self.recover(WAL.replay(wal.path))
+
+    # decisions without an END still have to reach every participant
+    def recover(self, records):
+        epoch = 0
+        for rec in records:
+            if rec["type"] == "EPOCH":
+                epoch = rec["epoch"]
+                continue
+            txid = rec["txid"]
+            if rec["type"] in ("COMMIT", "ABORT"):
+                tx = Tx(txid, rec.get("winner"))
+                tx.decision = rec["type"]
+                tx.durable = True
+                tx.finished = time.perf_counter()
+                tx._done.set()
+                tx.acks = set()
+                self.deciding[txid] = tx
+            elif rec["type"] == "END":
+                self.deciding.pop(txid, None)
+        # a crashed run may have handed out txids it never logged (participants can hold
+        # them as PREPARED), so every restart numbers its transactions in a fresh range
+        epoch += 1
+        self.wal.wait(self.wal.append({"type": "EPOCH", "epoch": epoch}))
+        self.next_txid = itertools.count(epoch * TXID_EPOCH + 1)
+        self.resend = [{"type": tx.decision, "txid": txid} for txid, tx in self.deciding.items()]
+
+    # wal flusher thread: hand the now-durable decisions back to the coordinator loop
+    def _on_durable(self, records):
+        decided = [r for r in records if r["type"] in ("COMMIT", "ABORT")]
+        if decided:
+            self.inbox.put({"type": "DURABLE", "records": decided})
+
+    # called from any thread
+    def submit(self, winner, on_done=None):
+        tx = Tx(next(self.next_txid), winner, on_done)
+        self.inbox.put({"type": "BEGIN", "tx": tx})
+        return tx
+
+    def stop(self):
+        self.inbox.put({"type": "STOP"})
+
+    def run(self):
+        if self.resend:
+            for name, inbox in self.participants:
+                inbox.put(list(self.resend))
+            self.resend = []
+        while True:
+            # block until something arrives or the oldest transaction runs out of time
+            wait = None
+            if self.deadlines:
+                wait = max(0.0, self.deadlines[0][0] - time.perf_counter())
+            try:
+                items = [self.inbox.get(timeout=wait)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < self.max_drain:
+                try:
+                    items.append(self.inbox.get_nowait())
+                except queue.Empty:
+                    break
+
+            outgoing = {name: [] for name, _ in self.participants}
+            stop = False
+            for item in items:
+                for msg in (item if isinstance(item, list) else [item]):
+                    mtype = msg.get("type")
+                    if mtype == "BEGIN":
+                        self._begin(msg["tx"], outgoing)
+                    elif mtype in ("VOTE_COMMIT", "VOTE_ABORT"):
+                        self._vote(msg, outgoing)
+                    elif mtype == "DURABLE":
+                        self._durable(msg, outgoing)
+                    elif mtype == "ACK":
+                        self._ack(msg)
+                    elif mtype == "STATUS":
+                        self._status(msg, outgoing)
+                    elif mtype == "STOP":
+                        stop = True
+            self._expire(outgoing)
+            self._flush(outgoing)
+            for _ in items:
+                self.inbox.task_done()
+            if stop:
+                break
+
+    def _begin(self, tx, outgoing):
+        tx.deadline = time.perf_counter() + self.timeout
+        self.active[tx.txid] = tx
+        heapq.heappush(self.deadlines, (tx.deadline, tx.txid))
+        prepare = {"type": "PREPARE", "txid": tx.txid, "winner": tx.winner}
+        for name, _ in self.participants:
+            outgoing[name].append(prepare)
+
+    def _vote(self, msg, outgoing):
+        tx = self.active.get(msg.get("txid"))
+        if tx is None:
+            return  # late vote for a transaction that already timed out
+        tx.votes[msg.get("from")] = msg["type"]
+        if len(tx.votes) == len(self.participants):
+            if all(v == "VOTE_COMMIT" for v in tx.votes.values()):
+                self._decide(tx, "COMMIT", outgoing)
+            else:
+                self._decide(tx, "ABORT", outgoing)
+
+    def _expire(self, outgoing):
+        now = time.perf_counter()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, txid = heapq.heappop(self.deadlines)
+            tx = self.active.get(txid)
+            if tx is not None:
+                self._decide(tx, "ABORT", outgoing)
+
+    def _decide(self, tx, decision, outgoing):
+        del self.active[tx.txid]
+        # the heap entry is left behind and skipped in _expire
+        tx.decision = decision
+        if self.wal is None:
+            self._send_decision(tx, outgoing)
+            return
+        # log first; the decision goes out when the flusher reports it durable
+        tx.acks = set()
+        self.deciding[tx.txid] = tx
+        self.wal.append({"type": decision, "txid": tx.txid, "winner": tx.winner})
+
+    # the decision is on disk now: it may leave, and STATUS may answer with it
+    def _durable(self, msg, outgoing):
+        for rec in msg["records"]:
+            tx = self.deciding.get(rec["txid"])
+            if tx is None or tx.durable:
+                continue    # already finished
+            tx.durable = True
+            self._send_decision(tx, outgoing)
+
+    def _ack(self, msg):
+        tx = self.deciding.get(msg.get("txid"))
+        if tx is None:
+            return
+        tx.acks.add(msg.get("from"))
+        if len(tx.acks) == len(self.participants):
+            del self.deciding[tx.txid]
+            self.wal.append({"type": "END", "txid": tx.txid})
+
+    def _status(self, msg, outgoing):
+        txid = msg.get("txid")
+        if txid in self.active:
+            return  # still voting; the decision will be sent as usual
+        tx = self.deciding.get(txid)
+        if tx is not None and not tx.durable:
+            return  # decided but not flushed yet; it goes to everyone once it is durable
+        decision = tx.decision if tx is not None else "ABORT"  # presumed abort
+        if msg.get("from") in outgoing:
+            outgoing[msg["from"]].append({"type": decision, "txid": txid})
+
+    def _send_decision(self, tx, outgoing):
+        decision = tx.decision
+        decision_msg = {"type": decision, "txid": tx.txid}
+        for name, _ in self.participants:
+            outgoing[name].append(decision_msg)
+        if decision == "COMMIT":
+            self.commits += 1
+        else:
+            self.aborts += 1
+        tx.finished = time.perf_counter()
+        tx._done.set()
+        if tx.on_done is not None:
+            tx.on_done(tx)
+
+    def _flush(self, outgoing):
+        for name, inbox in self.participants:
+            msgs = outgoing[name]
+            if msgs:
+                inbox.put(msgs)
+                self.batches_sent += 1
+
+
+# starts a coordinator with one participant per behavior; returns (coordinator, participants).
+# with wal_dir every node logs to <wal_dir>/<name>.wal (and recovers from it if it exists)
+def start_cluster(behaviors, timeout=2.0, wal_dir=None, wal_mode="group", group_ms=2.0):
+    def open_wal(name):
+        if wal_dir is None:
+            return None
+        return WAL(os.path.join(wal_dir, f"{name}.wal"), mode=wal_mode, group_ms=group_ms)
+
+    coord_inbox = queue.Queue()
+    parts = []
+    for i, behavior in enumerate(behaviors):
+        parts.append(TxParticipant(f"P{i}", queue.Queue(), coord_inbox, behavior, wal=open_wal(f"P{i}")))
+    coord = TxCoordinator([(p.name, p.inbox) for p in parts], coord_inbox, timeout=timeout,
+                          wal=open_wal("coordinator"))
+    for p in parts:
+        p.start()
+    coord.start()
+    return coord, parts
+
+
+def stop_cluster(coord, parts):
+    coord.stop()
+    coord.join()
+    for p in parts:
+        p.inbox.put({"type": "STOP"})
+    for p in parts:
+        p.join()
+    for node in [coord] + parts:
+        if node.wal is not None:
+            node.wal.close()
+
+
+def run_many(behaviors, n, timeout=2.0):
+    coord, parts = start_cluster(behaviors, timeout=timeout)
+    txs = [coord.submit(f"Player{i % 2 + 1}") for i in range(n)]
+    decisions = [tx.wait() for tx in txs]
+    stop_cluster(coord, parts)
+    print("commits:", decisions.count("COMMIT"), "aborts:", decisions.count("ABORT"))
+    print("batches sent:", coord.batches_sent, "for", n, "transactions x", len(parts), "participants")
+
+
+def main():
+    print("")
+    print("=== 1000 concurrent transactions, everyone commits ===")
+    run_many(["commit", "commit", "commit"], 1000)
+
+    print("")
+    print("=== 1000 concurrent transactions, an abort and a timeout ===")
+    run_many(["commit", "abort", "timeout"], 1000, timeout=0.5)
+
+
+if __name__ == "__main__":
+    main()
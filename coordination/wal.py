@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+
+# append-only write-ahead log, one json record per line
+#
+# mode="per-record": every append() writes and fsyncs before it returns (the slow baseline).
+# mode="group": append() only queues the record. a flusher thread writes everything queued
+# and fsyncs ONCE; records appended during that fsync go in the next one. when the last
+# fsync carried more than one record (there is load) it also waits up to group_ms for
+# more to join (or until group_max are queued). a lone record is flushed at once, so
+# one-at-a-time callers don't pay the window.
+# wait(lsn) blocks until that record is on disk; on_flush(records) is called after every
+# fsync with the records it made durable, for callers that cannot block.
+# a failed write or fsync (disk full, I/O error) is kept in `error` and closes the log:
+# nothing after it can be trusted to be on disk, so wait() and append() raise instead
+# of blocking forever.
+#
+# a crash can leave a half-written last line; replay() skips it.
+
+
+class WAL:
+    def __init__(self, path, mode="group", group_ms=2.0, group_max=1024, on_flush=None):
+        if mode not in ("group", "per-record"):
+            raise ValueError(f"unknown wal mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.group_sec = group_ms / 1000.0
+        self.group_max = group_max
+        self.on_flush = on_flush
+        self.f = open(path, "ab")
+        self.cond = threading.Condition()
+        self.pending = []       # (lsn, line, record) not written yet
+        self.next_lsn = 1
+        self.durable_lsn = 0
+        self.closed = False
+        self.error = None       # the OSError that stopped the log, if any
+        self.fsyncs = 0
+        self.records = 0
+        self.last_group = 0     # records in the previous fsync
+        self.flusher = None
+        if mode == "group":
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flusher.start()
+
+    # returns the record's lsn
+    def append(self, record):
+        line = (json.dumps(record) + "\n").encode()
+        with self.cond:
+            self._check()
+            lsn = self.next_lsn
+            self.next_lsn += 1
+            if self.mode == "per-record":
+                try:
+                    self._write([line])
+                except OSError as e:
+                    self._fail(e)
+                    raise
+                self.durable_lsn = lsn
+                self.records += 1
+            else:
+                self.pending.append((lsn, line, record))
+                if len(self.pending) == 1 or len(self.pending) >= self.group_max:
+                    self.cond.notify_all()
+                return lsn
+        if self.on_flush is not None:
+            self.on_flush([record])
+        return lsn
+
+    def wait(self, lsn):
+        with self.cond:
+            self.cond.wait_for(lambda: self.durable_lsn >= lsn or self.closed)
+            if self.durable_lsn < lsn:
+                self._check()
+
+    # cond held
+    def _check(self):
+        if self.error is not None:
+            raise OSError(f"wal {self.path} failed: {self.error}") from self.error
+        if self.closed:
+            raise ValueError("wal is closed")
+
+    # cond held. the log is unusable from here on; wake everyone waiting on it
+    def _fail(self, e):
+        self.error = e
+        self.closed = True
+        self.cond.notify_all()
+
+    def _write(self, lines):
+        self.f.write(b"".join(lines))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.fsyncs += 1
+
+    def _flush_loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if not self.pending and self.closed:
+                    return
+                # the group commit window: let more records join this fsync
+                if self.group_sec > 0 and self.last_group > 1:
+                    self.cond.wait_for(lambda: len(self.pending) >= self.group_max or self.closed,
+                                       self.group_sec)
+                batch = self.pending
+                self.pending = []
+                self.last_group = len(batch)
+            # write + fsync outside the lock so appends keep queueing meanwhile
+            try:
+                self._write([line for _, line, _ in batch])
+            except OSError as e:
+                with self.cond:
+                    self._fail(e)
+                return
+            with self.cond:
+                self.durable_lsn = batch[-1][0]
+                self.records += len(batch)
+                self.cond.notify_all()
+            if self.on_flush is not None:
+                self.on_flush([rec for _, _, rec in batch])
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.flusher is not None:
+            self.flusher.join()
+        try:
+            self.f.close()
+        except OSError:
+            if self.error is None:
+                raise   # after a failure the buffered tail is already lost and reported
+
+    @staticmethod
+    def replay(path):
+        # every complete record in the log, oldest first
+        if not os.path.exists(path):
+            return []
+        out = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    break  # torn tail from a crash
+        return out
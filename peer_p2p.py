@@ -1,51 +1,52 @@
 '''
 The goal of the addition in this part 4 
 '''
-import asyncio, json, socket, sys, time, random
-from collections import deque
+import asyncio, json, os, socket, sys, time, random
 from contextlib import suppress
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "IPC"))
+from rolling_window import RollingWindow
+from keyed_stats import DensityStats
+from protocol import READ_SIZE, Session
+import codec
+
 DISCOVERY_PORT = 9999 # udp discovery
 BEACON_SEC     = 2.0 #sening a beacon out every 2 seconds
 PEER_TTL_SEC   = 8.0 # forget peers not seen in 8 seconds
 
 DEFAULT_TCP_PORT = 5000        # tcp port used for data exchange
 WINDOW_SEC       = 30          # rolling average window size in seconds
+HELLO_SEC        = 2.0         # how long a dialed peer gets to answer the codec hello
 
 
 '''
 Keeps a rolling window of 30 seconds of density and then computes their average 
+The running sum/count lives in IPC/rolling_window.py so every server shares it
 '''
-class RollingAvg30s:
+class RollingAvg30s(RollingWindow):
     def __init__(self, window_sec=WINDOW_SEC):
-        self.window = window_sec
-        self.samples = deque()   # (ts, density)
+        super().__init__(window_sec)
     #this gets rid of any samples who're older than the  30 second window  
     def clean(self, now=None):
-        if now is None:
-            now = time.time()
-        while self.samples and now - self.samples[0][0] > self.window:
-            self.samples.popleft()
-    #just adding those new samples in
-    def add(self, density, now=None):
-        if now is None:
-            now = time.time()
-        self.clean(now)
-        self.samples.append((now, float(density)))
-    #Averaging out the samples of those recent balues 
+        self.evict(now)
+    #Averaging out the samples of those recent balues (O(1), no re-summing)
     def avg(self, now=None):
-        self.clean(now)
-        if not self.samples:
-            return 0.0
-        return sum(d for _, d in self.samples) / len(self.samples)
+        self.evict(now)
+        return super().avg()
 
 class Peer:
-    def __init__(self, name, tcp_port=DEFAULT_TCP_PORT):
+    def __init__(self, name, tcp_port=DEFAULT_TCP_PORT, batch=1, window=0, codec_name=codec.CODEC_JSON):
         self.name = name
         self.tcp_port = int(tcp_port)
+        self.batch = max(1, int(batch))   # readings per frame
+        self.window = int(window)         # max unacked readings per peer, 0 = no seq numbers
+        self.codec = codec_name           # what we ask for on outgoing connections (json or bin)
+        self.acked = {}            # cumulative ack per peer {(ip, port): seq}
+        self.ack_event = {}        # wakes the sender when an ack arrives {(ip, port): Event}
         self.known = {}            #peers discovered {(ip, port): last_seen_ts}
         self.outgoing = {}         # tcp connections {(ip, port): (reader, writer)}
         self.avg = RollingAvg30s()
+        self.stats = DensityStats()  # per-sensor windows answering {"query": ...} lines
 
     #Discovery udp 
     async def discovery_beacon(self):
@@ -77,30 +78,28 @@ class Peer:
                 pass
 
 
-    #recieves and json lines from peers, updates the rolling averages, and  sends back an acknowlegdement 
+    #recieves json lines from peers, updates the rolling averages, and  sends back an acknowlegdement 
     # While also printing the information to the terminal
+    # everything complete in one read is handled as a batch with a single write (see IPC/protocol.py)
     async def handle_conn(self, reader, writer):
         addr = writer.get_extra_info("peername")
+        session = Session(self.avg, stats=self.stats)
         try:
             while True:
-                line = await reader.readline()
-                if not line:
+                data = await reader.read(READ_SIZE)
+                if not data:
                     break
-                try:
-                    msg = json.loads(line.decode())
-                    # expecting the schema from sensor.py: {"sensor_id": SID, "density": x}
-                    density = float(msg.get("density", 0.0))
-                    self.avg.add(density)
-                    rolling = self.avg.avg()
-                    # mimic server ack
-                    ack = {"ok": True, "rolling_avg_30s": rolling}
-                    writer.write((json.dumps(ack) + "\n").encode())
-                    await writer.drain()
-                    print(f"[IN  {addr}] {msg} | avg30={rolling:.2f}")
-                except Exception as e:
-                    err = {"ok": False, "error": str(e)}
-                    writer.write((json.dumps(err) + "\n").encode())
+                # same ack shapes as IPC/server.py: legacy per-line acks, one cumulative ack,
+                # or binary frames if the peer opened with the codec hello
+                out = session.feed(data)
+                if out:
+                    writer.write(out)
                     await writer.drain()
+                    print(f"[IN  {addr}] {len(data)} bytes ({session.codec}) | avg30={self.avg.avg():.2f}")
+                if session.closed:
+                    break
+        except (ConnectionError, ValueError):
+            pass
         finally:
             writer.close()
             with suppress(Exception):
@@ -138,21 +137,67 @@ class Peer:
                         r, w = await asyncio.open_connection(ip, port)
                         self.outgoing[peer] = (r, w)
                         print(f"[{self.name}] Connected to {peer}")
-                        asyncio.create_task(self.sender_loop(peer, r, w))
-                        asyncio.create_task(self.reader_log(peer, r))
+                        asyncio.create_task(self.link(peer, r, w))
                         #This creates both a sender and a reader loop for every connection
                     except Exception:
                         pass
 
             await asyncio.sleep(1.0)
 
+    # one outgoing connection: agree on the codec first (the same hello as sensor.py --codec bin),
+    # then run the sender and the matching ack reader
+    async def link(self, peer, reader, writer):
+        binary = self.codec == "bin" and await self.negotiate(reader, writer)
+        print(f"[{self.name}] {peer} speaks {codec.CODEC_BIN if binary else codec.CODEC_JSON}")
+        if binary:
+            asyncio.create_task(self.binary_reader_log(peer, reader))
+        else:
+            asyncio.create_task(self.reader_log(peer, reader))
+        await self.sender_loop(peer, reader, writer, binary)
+
+    # asks for binary frames; a peer that does not answer with the codec keeps json lines
+    async def negotiate(self, reader, writer):
+        try:
+            writer.write(codec.HELLO_LINE)
+            await writer.drain()
+            reply = json.loads(await asyncio.wait_for(reader.readline(), HELLO_SEC))
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            return False
+        return isinstance(reply, dict) and reply.get("codec") == codec.CODEC_BIN
+
     # Send sensor style messages periodically (this replaces sensor.py’s loop)
-    async def sender_loop(self, peer, reader, writer):
+    # with --window the readings carry seq numbers and at most `window` stay unacked
+    # binary links always number readings (one READING frame each) and wait for acks
+    async def sender_loop(self, peer, reader, writer, binary=False):
+        seq = 0
+        pipelined = binary or self.window > 0 or self.batch > 1
+        window = max(self.window, self.batch)
+        sid = self.name.encode()
+        self.acked[peer] = 0
+        event = self.ack_event.setdefault(peer, asyncio.Event())
         while not writer.is_closing():
-            density = max(0.0, random.gauss(35, 10))
-            msg = {"sensor_id": self.name, "density": density}
+            readings = [max(0.0, random.gauss(35, 10)) for _ in range(self.batch)]
+            if pipelined:
+                while seq + len(readings) - self.acked.get(peer, 0) > window:
+                    event.clear()
+                    await event.wait()
+                    if writer.is_closing() or reader.at_eof():
+                        return
+                first, seq = seq + 1, seq + len(readings)
+                if binary:
+                    now = time.time()
+                    data = b"".join(codec.encode_reading(sid, d, now, first + i) for i, d in enumerate(readings))
+                else:
+                    msg = {"sensor_id": self.name, "seq": seq}
+                    if self.batch == 1:
+                        msg["density"] = readings[0]
+                    else:
+                        msg["readings"] = readings
+                    data = (json.dumps(msg) + "\n").encode()
+            else:
+                data = (json.dumps({"sensor_id": self.name, "density": readings[0]}) + "\n").encode()
             try:
-                writer.write((json.dumps(msg) + "\n").encode())
+                writer.write(data)
                 await writer.drain()
             except Exception:
                 break
@@ -166,9 +211,40 @@ class Peer:
                 line = await reader.readline()
                 if not line:
                     break
+                with suppress(ValueError):
+                    ack = json.loads(line)
+                    if "ack" in ack and ack["ack"] > self.acked.get(peer, 0):
+                        self.acked[peer] = ack["ack"]
+                        self.ack_event.setdefault(peer, asyncio.Event()).set()
                 print(f"[ACK {addr}] {line.decode().strip()}")
         except Exception:
             pass
+        finally:
+            # let a sender blocked on the window notice the connection is gone
+            self.ack_event.setdefault(peer, asyncio.Event()).set()
+    # same as reader_log for a binary link: ACK frames instead of json lines
+    async def binary_reader_log(self, peer, reader):
+        addr = f"{peer[0]}:{peer[1]}"
+        buf = b""
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                frames, buf = codec.decode_frames(buf + data)
+                for frame in frames:
+                    if frame[0] != codec.ACK:
+                        print(f"[ACK {addr}] {frame[1:]}")
+                        continue
+                    _, ok, seq, count, avg = frame
+                    if seq > self.acked.get(peer, 0):
+                        self.acked[peer] = seq
+                        self.ack_event.setdefault(peer, asyncio.Event()).set()
+                    print(f"[ACK {addr}] ack={seq} count={count} rolling_avg_30s={avg:.3f}")
+        except Exception:
+            pass
+        finally:
+            self.ack_event.setdefault(peer, asyncio.Event()).set()
     #here we're just running all of them together 
     async def run(self):
         await asyncio.gather(
@@ -183,8 +259,12 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--name", required=True, help="unique peer id (e.g., P-001)")
     ap.add_argument("--port", type=int, default=DEFAULT_TCP_PORT, help="TCP listen port")
+    ap.add_argument("--batch", type=int, default=1, help="readings per frame sent to each peer")
+    ap.add_argument("--window", type=int, default=0, help="max unacked readings per peer (0 = old protocol)")
+    ap.add_argument("--codec", choices=[codec.CODEC_JSON, "bin"], default=codec.CODEC_JSON,
+                    help="wire format asked for on outgoing connections (json lines or binary frames)")
     args = ap.parse_args()
-    asyncio.run(Peer(args.name, args.port).run())
+    asyncio.run(Peer(args.name, args.port, args.batch, args.window, args.codec).run())
     #Start a peer from the command line using the command 
     #python peer_p2p.py --name p-001 --port 5001
 